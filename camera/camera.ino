@@ -11,6 +11,7 @@
 
 // Server Configuration
 #define API_URL "http://192.168.10.171:8888/api"
+#define RIG_ID "default"  // Turntable this board belongs to
 
 // Camera pins for ESP32-CAM HW-297
 #define PWDN_GPIO_NUM     32
@@ -34,6 +35,10 @@
 // Flash LED Pin (built into ESP32-CAM)
 #define FLASH_LED_PIN 4  // GPIO4 is the built-in flash LED
 
+// Capture settings used whenever the server doesn't ask for others
+#define DEFAULT_FRAMESIZE FRAMESIZE_SVGA
+#define DEFAULT_JPEG_QUALITY 12
+#define MAX_FRAMESIZE FRAMESIZE_UXGA  // Largest framesize the server's profiles may ask for
 
 // WiFi Credentials from config.h
 const char* ssid = WIFI_SSID;
@@ -45,6 +50,7 @@ String auth_token;
 bool is_registered = false;
 unsigned long last_heartbeat = 0;
 const unsigned long HEARTBEAT_INTERVAL = 10000;  // 10 seconds
+framesize_t max_framesize = DEFAULT_FRAMESIZE;  // Largest frame the frame buffer was sized for
 
 // Create web server
 WebServer server(80);
@@ -79,10 +85,21 @@ void setup() {
   
   config.xclk_freq_hz = 20000000;
   config.pixel_format = PIXFORMAT_JPEG;
-  config.frame_size = FRAMESIZE_SVGA;
-  config.jpeg_quality = 12;
+  config.jpeg_quality = DEFAULT_JPEG_QUALITY;
   config.fb_count = 1;
 
+  // The frame buffer is sized for the framesize the camera starts with, so start at the largest
+  // one the server may ask for and drop to the default below. Without PSRAM only the default fits
+  if (psramFound()) {
+    config.frame_size = MAX_FRAMESIZE;
+    config.fb_location = CAMERA_FB_IN_PSRAM;
+    max_framesize = MAX_FRAMESIZE;
+  } else {
+    config.frame_size = DEFAULT_FRAMESIZE;
+    config.fb_location = CAMERA_FB_IN_DRAM;
+    Serial.println("No PSRAM, captures are limited to the default framesize");
+  }
+
   esp_err_t err = esp_camera_init(&config);
   if (err != ESP_OK) {
     Serial.printf("Camera init failed with error 0x%x\n", err);
@@ -93,8 +110,8 @@ void setup() {
 
   sensor_t * s = esp_camera_sensor_get();
   if (s) {
-    s->set_framesize(s, FRAMESIZE_SVGA);
-    s->set_quality(s, 12);
+    s->set_framesize(s, DEFAULT_FRAMESIZE);
+    s->set_quality(s, DEFAULT_JPEG_QUALITY);
     s->set_brightness(s, 1);
     s->set_saturation(s, -2);
     delay(100);
@@ -163,7 +180,7 @@ void registerWithServer() {
   http.addHeader("Content-Type", "application/json");
 
   String ip = WiFi.localIP().toString();
-  String payload = "{\"type\":\"camera\",\"ip\":\"" + ip + "\"}";
+  String payload = "{\"type\":\"camera\",\"ip\":\"" + ip + "\",\"rig\":\"" + String(RIG_ID) + "\"}";
   
   Serial.println("Sending payload to server");
   int httpCode = http.POST(payload);
@@ -197,8 +214,17 @@ void sendHeartbeat() {
   HTTPClient http;
   http.begin(String(server_url) + "/heartbeat");
   http.addHeader("Authorization", "Bearer " + auth_token);
-  
-  int httpCode = http.POST("");
+  http.addHeader("Content-Type", "application/json");
+
+  // Telemetry is kept by the server's board registry
+  StaticJsonDocument<128> doc;
+  doc["rssi"] = WiFi.RSSI();
+  doc["free_heap"] = ESP.getFreeHeap();
+  doc["uptime"] = millis() / 1000;
+  String payload;
+  serializeJson(doc, payload);
+
+  int httpCode = http.POST(payload);
   
   if (httpCode != 200) {
     Serial.printf("Heartbeat failed: %d\n", httpCode);
@@ -209,6 +235,56 @@ void sendHeartbeat() {
   http.end();
 }
 
+framesize_t parseFramesize(const String& name) {
+  if (name == "QVGA") return FRAMESIZE_QVGA;
+  if (name == "VGA") return FRAMESIZE_VGA;
+  if (name == "XGA") return FRAMESIZE_XGA;
+  if (name == "HD") return FRAMESIZE_HD;
+  if (name == "SXGA") return FRAMESIZE_SXGA;
+  if (name == "UXGA") return FRAMESIZE_UXGA;
+  return DEFAULT_FRAMESIZE;
+}
+
+// Apply per-shot settings sent by the server's scan profile, returns true if anything changed
+bool applyCaptureSettings(JsonDocument& doc) {
+  sensor_t * s = esp_camera_sensor_get();
+  if (!s) return false;
+
+  // Settings a request leaves out go back to the defaults, so a profile's settings don't leak
+  // into later scans or single shots
+  bool changed = false;
+  framesize_t framesize = doc.containsKey("framesize")
+    ? parseFramesize(doc["framesize"].as<String>())
+    : DEFAULT_FRAMESIZE;
+  if (framesize > max_framesize) {
+    framesize = max_framesize;
+  }
+  if (s->status.framesize != framesize) {
+    s->set_framesize(s, framesize);
+    changed = true;
+  }
+
+  int quality = doc.containsKey("quality") ? doc["quality"].as<int>() : DEFAULT_JPEG_QUALITY;
+  if (s->status.quality != quality) {
+    s->set_quality(s, quality);
+    changed = true;
+  }
+
+  if (doc.containsKey("exposure")) {
+    int exposure = doc["exposure"].as<int>();
+    if (s->status.aec || s->status.aec_value != exposure) {
+      s->set_exposure_ctrl(s, 0);
+      s->set_aec_value(s, exposure);
+      changed = true;
+    }
+  } else if (!s->status.aec) {
+    s->set_exposure_ctrl(s, 1);
+    changed = true;
+  }
+
+  return changed;
+}
+
 void handleCapture() {
   Serial.println("Capture request received");
   
@@ -240,6 +316,12 @@ void handleCapture() {
   Serial.print("Starting capture for step: ");
   Serial.println(step);
 
+  if (applyCaptureSettings(doc)) {
+    // The buffered frame was taken with the old settings, drop it
+    camera_fb_t* stale = esp_camera_fb_get();
+    if (stale) esp_camera_fb_return(stale);
+  }
+
   // Capture photo first
   camera_fb_t* fb = esp_camera_fb_get();
   if (!fb) {
@@ -11,6 +11,7 @@
 
 // Server Configuration
 #define API_URL "http://192.168.10.171:8888/api"
+#define RIG_ID "default"  // Turntable this board belongs to
 
 // Stepper Motor Pins for ESP32-C3
 #define IN1_PIN 2   // GPIO2
@@ -301,7 +302,7 @@ void registerWithServer() {
   http.addHeader("Content-Type", "application/json");
 
   String ip = WiFi.localIP().toString();
-  String payload = "{\"type\":\"controller\",\"ip\":\"" + ip + "\"}";
+  String payload = "{\"type\":\"controller\",\"ip\":\"" + ip + "\",\"rig\":\"" + String(RIG_ID) + "\"}";
   
   Serial.println("Sending payload to server");
   int httpCode = http.POST(payload);
@@ -336,8 +337,17 @@ void sendHeartbeat() {
   HTTPClient http;
   http.begin(String(server_url) + "/heartbeat");
   http.addHeader("Authorization", "Bearer " + auth_token);
-  
-  int httpCode = http.POST("");
+  http.addHeader("Content-Type", "application/json");
+
+  // Telemetry is kept by the server's board registry
+  StaticJsonDocument<128> doc;
+  doc["rssi"] = WiFi.RSSI();
+  doc["free_heap"] = ESP.getFreeHeap();
+  doc["uptime"] = millis() / 1000;
+  String payload;
+  serializeJson(doc, payload);
+
+  int httpCode = http.POST(payload);
   
   if (httpCode != 200) {
     Serial.printf("Heartbeat failed: %d\n", httpCode);
@@ -1,113 +1,300 @@
-from flask import Flask, request, jsonify
+import os
+import time
 import requests
-from board_manager import BoardManager
-from scan_manager import ScanManager
+from dataclasses import asdict
+from typing import Callable, Optional
+from flask import Flask, Blueprint, current_app, request, jsonify, abort, g, send_file
+from config import Config
+from lanes import Lane, RequestLanes, lane
+from processing import ProcessingScheduler
+from pyramid import PyramidBuilder
+from profiles import FRAMESIZES, CaptureSettings, ScanProfile, load_profiles, profile_from_dict
+from recording import RecordingHttp, TrafficRecorder
+from registry import BoardRegistry
+from rig_manager import Rig, RigManager
+from storage import PhotoStorage, UploadTooLarge
+from tracing import RequestProfiler
 
-app = Flask(__name__)
-board_manager = BoardManager()
-scan_manager = ScanManager(board_manager)
+api = Blueprint('api', __name__)
 
-@app.route('/api/register', methods=['POST'])
+def get_rig_manager() -> RigManager:
+    return current_app.extensions['rig_manager']
+
+def get_scheduler() -> ProcessingScheduler:
+    return current_app.extensions['scheduler']
+
+def get_profiles() -> dict[str, ScanProfile]:
+    return current_app.extensions['profiles']
+
+def get_profiler() -> RequestProfiler:
+    return current_app.extensions['profiler']
+
+def get_lanes() -> RequestLanes:
+    return current_app.extensions['lanes']
+
+def get_token() -> str:
+    return request.headers.get('Authorization', '').replace('Bearer ', '')
+
+def get_rig_id() -> str:
+    data = request.get_json(silent=True) if request.is_json else None
+    rig_id = request.args.get('rig') or (data.get('rig') if isinstance(data, dict) else None)
+    return rig_id or current_app.config['PHOTOGRAMMETRY'].default_rig
+
+def get_rig() -> Rig:
+    # User facing endpoints address a rig by ?rig= or a "rig" field, boards by their token
+    rig = get_rig_manager().get(get_rig_id())
+    if not rig:
+        abort(404, description="Unknown rig")
+    return rig
+
+def get_board_rig() -> Optional[Rig]:
+    return get_rig_manager().find_by_token(get_token())
+
+@api.before_request
+def begin_request():
+    g.started = time.perf_counter()
+    g.profile = get_profiler().begin()
+
+@api.before_request
+def admit_request():
+    # Captures and uploads run in a bounded lane so they can't crowd out heartbeats and aborts
+    view = current_app.view_functions.get(request.endpoint)
+    request_lane = get_lanes().get(getattr(view, 'lane', None))
+    status = request_lane.enter(getattr(view, 'shed', True))
+    if status is not None:
+        message = "Lane queue full" if status == 429 else "Timed out waiting for a free slot"
+        return jsonify({"error": message, "lane": request_lane.name}), status, {"Retry-After": "1"}
+    g.lane = request_lane
+
+@api.after_request
+def record_request(response):
+    recorder = current_app.extensions.get('recorder')
+    if recorder:
+        recorder.record_inbound(request, response, g.started)
+    return response
+
+@api.teardown_request
+def end_request_profile(exc):
+    profile = g.pop('profile', None)
+    if profile:
+        get_profiler().end(profile)
+
+@api.teardown_request
+def release_lane(exc):
+    request_lane = g.pop('lane', None)
+    if request_lane:
+        request_lane.leave(time.perf_counter() - g.started)
+
+@api.errorhandler(404)
+def handle_not_found(e):
+    return jsonify({"error": e.description}), 404
+
+@api.route('/api/register', methods=['POST'])
 def register_board():
     data = request.get_json()
     if not data or 'type' not in data or 'ip' not in data:
         return jsonify({"error": "Missing board type or IP"}), 400
 
     try:
-        board = board_manager.register_board(data['type'], data['ip'])
+        rig, board = get_rig_manager().register_board(get_rig_id(), data['type'], data['ip'])
+        print(f"{data['type']} board registered at {data['ip']} for rig {rig.rig_id}")
         if data['type'] == 'controller':
-            board_manager.update_lcd("System Ready")
+            rig.board_manager.update_lcd("System Ready")
         return jsonify({
             "token": board.token,
+            "rig": rig.rig_id,
             "message": f"{data['type']} registered successfully"
         })
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
 
-@app.route('/api/heartbeat', methods=['POST'])
+@api.route('/api/heartbeat', methods=['POST'])
 def heartbeat():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
+    token = get_token()
     if not token:
         return jsonify({"error": "No token provided"}), 401
 
-    if board_manager.update_heartbeat(token):
+    # Boards may report telemetry (signal strength, free heap, uptime) with their heartbeat
+    telemetry = request.get_json(silent=True)
+    if get_rig_manager().update_heartbeat(token, telemetry if isinstance(telemetry, dict) else None):
         return jsonify({"status": "ok"})
-    
+
     return jsonify({"error": "Invalid token"}), 401
 
-@app.route('/api/status', methods=['GET'])
+@api.route('/api/status', methods=['GET'])
 def check_status():
-    board_status = board_manager.get_status()
-    board_status["scan_status"] = scan_manager.get_status()
-    return jsonify(board_status)
+    rig = get_rig()
+    status = rig.get_status()
+    status["rig"] = rig.rig_id
+    status["scan"] = rig.scan_manager.get_progress()
+    status["telemetry"] = rig.board_manager.get_telemetry()
+    status["transfer"] = rig.scan_manager.get_transfer_status()
+    return jsonify(status)
+
+@api.route('/api/scans', methods=['GET'])
+def list_scans():
+    return jsonify([asdict(session) for session in get_rig().scan_manager.sessions])
+
+@api.route('/api/scans/<scan_id>/trace', methods=['GET'])
+@lane('io')
+def get_scan_trace(scan_id):
+    scan_manager = get_rig().scan_manager
+    # Only ids of known scans are turned into paths
+    if not any(session.scan_id == scan_id for session in scan_manager.sessions):
+        abort(404, description="Unknown scan")
+    path = os.path.abspath(scan_manager.trace_path(scan_id))
+    if not os.path.exists(path):
+        abort(404, description="No trace for this scan yet")
+    return send_file(path, mimetype='application/json')
+
+@api.route('/api/profiler', methods=['GET'])
+def get_profiler_report():
+    profiler = get_profiler()
+    if request.args.get('format') == 'json':
+        return jsonify(profiler.get_status())
+    try:
+        limit = int(request.args.get('limit', 40))
+        return profiler.report(request.args.get('sort', 'cumulative'), limit), 200, {'Content-Type': 'text/plain'}
+    except (KeyError, ValueError) as e:
+        return jsonify({"error": f"Invalid report options: {str(e)}"}), 400
+
+@api.route('/api/profiler', methods=['POST'])
+def set_profiler():
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data.get('enabled'), bool):
+        return jsonify({"error": "Missing enabled flag"}), 400
+    get_profiler().set_enabled(data['enabled'])
+    return jsonify(get_profiler().get_status())
+
+@api.route('/api/lanes', methods=['GET'])
+def get_lane_metrics():
+    metrics = get_lanes().get_metrics()
+    # CPU work (input preparation and reconstruction) is bounded by the processing workers
+    metrics["cpu"] = get_scheduler().get_metrics()
+    return jsonify(metrics)
+
+@api.route('/api/profiles', methods=['GET'])
+def list_profiles():
+    return jsonify({name: asdict(profile) for name, profile in get_profiles().items()})
 
-@app.route('/api/start', methods=['POST'])
+@api.route('/api/rigs', methods=['GET'])
+def list_rigs():
+    return jsonify({rig.rig_id: rig.get_status() for rig in get_rig_manager().all()})
+
+@api.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    jobs = get_scheduler().list_jobs(request.args.get('rig'))
+    return jsonify([asdict(job) for job in jobs])
+
+@api.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = get_scheduler().get_job(job_id)
+    if not job:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(asdict(job))
+
+@api.route('/api/start', methods=['POST'])
 def start_scan():
-    success, error = scan_manager.start_scan()
+    rig = get_rig()
+    data = request.get_json(silent=True) or {}
+
+    # Either the name of a known profile or an inline profile definition
+    profile = None
+    if 'profile' in data:
+        if isinstance(data['profile'], dict):
+            try:
+                profile = profile_from_dict(data['profile'].get('name', 'custom'), data['profile'])
+            except (KeyError, TypeError, ValueError) as e:
+                return jsonify({"error": f"Invalid profile: {str(e)}"}), 400
+        elif data['profile'] in get_profiles():
+            profile = get_profiles()[data['profile']]
+        else:
+            return jsonify({"error": f"Unknown profile: {data['profile']}"}), 400
+
+    success, error = rig.scan_manager.start_scan(profile)
+    if not success:
+        return jsonify({"error": error}), 409 if "in progress" in error else 503
+    return jsonify({"message": "Scan started", "scan": rig.scan_manager.get_progress()})
+
+@api.route('/api/resume', methods=['POST'])
+def resume_scan():
+    rig = get_rig()
+    data = request.get_json(silent=True) or {}
+
+    success, error = rig.scan_manager.resume_scan(data.get('scan_id'))
+    if not success:
+        return jsonify({"error": error}), 409 if "in progress" in error or "to resume" in error else 503
+    return jsonify({"message": "Scan resumed", "scan": rig.scan_manager.get_progress()})
+
+@api.route('/api/calibrate', methods=['POST'])
+def start_calibration():
+    rig = get_rig()
+    data = request.get_json(silent=True) or {}
+
+    try:
+        step_sizes = [float(size) for size in data.get('step_sizes', [6, 15, 30])]
+        delays = [float(delay) for delay in data.get('delays', [0, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5])]
+        trials = int(data.get('trials', 2))
+        threshold = float(data.get('threshold', 0.9))
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid calibration parameters"}), 400
+
+    if not step_sizes or not delays or trials < 1 or any(size <= 0 or size > 180 for size in step_sizes):
+        return jsonify({"error": "Invalid calibration parameters"}), 400
+
+    success, error = rig.scan_manager.start_calibration(step_sizes, delays, trials, threshold)
     if not success:
-        return jsonify({"error": error}), 409 if error == "Scan already in progress" else 503
-    return jsonify({"message": "Scan started"})
+        return jsonify({"error": error}), 409 if "in progress" in error else 503
+    return jsonify({"message": "Calibration started"}), 202
 
-@app.route('/api/capture_complete', methods=['POST'])
+@api.route('/api/calibrate', methods=['GET'])
+def get_calibration():
+    scan_manager = get_rig().scan_manager
+    return jsonify({
+        "calibration": scan_manager.get_calibration(),
+        "settle_times": scan_manager.settle_times.as_dict()
+    })
+
+@api.route('/api/capture_complete', methods=['POST'])
 def handle_capture_complete():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not board_manager.camera_board or token != board_manager.camera_board.token:
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_camera(get_token()):
         return jsonify({"error": "Unauthorized"}), 401
 
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     step = data.get('step', 0)
-    scan_manager.handle_capture_complete(step)
+    rig.scan_manager.handle_capture_complete(step)
     return jsonify({"status": "ok"})
 
-@app.route('/api/rotation_complete', methods=['POST'])
+@api.route('/api/rotation_complete', methods=['POST'])
+@lane('io', shed=False)
 def handle_rotation_complete():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not board_manager.controller_board or token != board_manager.controller_board.token:
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_controller(get_token()):
         return jsonify({"error": "Unauthorized"}), 401
 
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     step = data.get('step', 0)
-    
-    try:
-        response = requests.post(
-            f"http://{board_manager.camera_board.ip_address}/capture",
-            json={"step": step},
-            headers={"Authorization": f"Bearer {board_manager.camera_board.token}"},
-            timeout=5
-        )
-        if response.status_code != 200:
-            board_manager.update_lcd("Error", "Capture Failed")
-            return jsonify({"error": "Failed to trigger capture"}), 500
-            
-        # Log response details
-        print(f"Response headers: {response.headers}")
-        print(f"Response content length: {len(response.content)}")
-        print(f"Response content type: {response.headers.get('Content-Type')}")
-        
-        # Save the photo data
-        photo_data = response.content
-        if len(photo_data) == 0:
-            print("Error: Received empty photo data")
-            return jsonify({"error": "Received empty photo data"}), 500
-            
-        scan_manager.save_photo(f"photo_{step}.jpg", photo_data)
-        return jsonify({"status": "ok"})
-    except Exception as e:
-        board_manager.update_lcd("Error", "Capture Failed")
-        return jsonify({"error": f"Camera error: {str(e)}"}), 500
 
-@app.route('/api/scan_complete', methods=['POST'])
+    success, error = rig.scan_manager.handle_rotation_complete(step)
+    if not success:
+        return jsonify({"error": error}), 500
+    return jsonify({"status": "ok"})
+
+@api.route('/api/scan_complete', methods=['POST'])
 def handle_scan_complete():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not board_manager.controller_board or token != board_manager.controller_board.token:
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_controller(get_token()):
         return jsonify({"error": "Unauthorized"}), 401
 
-    scan_manager.handle_scan_complete()
+    job = rig.scan_manager.handle_scan_complete()
+    if job:
+        return jsonify({"status": "ok", "job_id": job.job_id})
     return jsonify({"status": "ok"})
 
-@app.route('/api/abort', methods=['POST'])
+@api.route('/api/abort', methods=['POST'])
 def abort_scan():
-    success, errors = scan_manager.abort_scan()
+    success, errors = get_rig().scan_manager.abort_scan()
     if not success:
         return jsonify({"error": errors[0]}), 409
 
@@ -119,64 +306,65 @@ def abort_scan():
 
     return jsonify({"message": "Scan aborted successfully"})
 
-@app.route('/lcd', methods=['POST'])
-@app.route('/api/lcd', methods=['POST'])
+@api.route('/lcd', methods=['POST'])
+@api.route('/api/lcd', methods=['POST'])
 def handle_lcd_update():
     data = request.get_json()
     if not data or 'lines' not in data:
         return jsonify({"error": "Missing lines array"}), 400
-        
+
     lines = data['lines']
     if not isinstance(lines, list) or len(lines) == 0 or len(lines) > 2:
         return jsonify({"error": "Expected array of 1 or 2 lines"}), 400
-        
+
     if not all(isinstance(line, str) for line in lines):
         return jsonify({"error": "All lines must be strings"}), 400
-        
+
     # Truncate lines to 16 characters if needed
     lines = [line[:16] for line in lines]
-    
+
     # Update LCD using board manager
-    if board_manager.update_lcd(lines[0], lines[1] if len(lines) > 1 else None):
+    if get_rig().board_manager.update_lcd(lines[0], lines[1] if len(lines) > 1 else None):
         return jsonify({"message": "LCD updated successfully"})
     else:
         return jsonify({"error": "Failed to update LCD"}), 500
 
-@app.route('/api/capture_single', methods=['POST'])
+@api.route('/api/capture_single', methods=['POST'])
+@lane('io')
 def capture_single():
+    rig = get_rig()
+    board_manager = rig.board_manager
     # Check if camera is connected
     if not board_manager.camera_board or not board_manager.camera_board.is_alive():
         return jsonify({"error": "Camera not connected"}), 503
 
-    try:
-        # Request capture from camera
-        response = requests.post(
-            f"http://{board_manager.camera_board.ip_address}/capture",
-            json={"step": 0},  # Use step 0 for single shots
-            headers={"Authorization": f"Bearer {board_manager.camera_board.token}"},
-            timeout=5
-        )
-        if response.status_code != 200:
-            return jsonify({"error": "Failed to capture photo"}), 500
-            
-        # Log response details
-        print(f"Response headers: {response.headers}")
-        print(f"Response content length: {len(response.content)}")
-        print(f"Response content type: {response.headers.get('Content-Type')}")
-        
-        # Save the photo data
-        photo_data = response.content
-        if len(photo_data) == 0:
-            print("Error: Received empty photo data")
-            return jsonify({"error": "Received empty photo data"}), 500
-            
-        scan_manager.save_photo("photo_0.jpg", photo_data)
-        return jsonify({"message": "Photo captured and saved successfully"})
-    except Exception as e:
-        return jsonify({"error": f"Camera error: {str(e)}"}), 500
+    # Use step 0 for single shots
+    success, error = rig.scan_manager.capture_photo(0, session=rig.scan_manager.session)
+    if not success:
+        return jsonify({"error": error}), 500
+    return jsonify({"message": "Photo captured and saved successfully"})
+
+@api.route('/api/background', methods=['POST'])
+@lane('io')
+def capture_background():
+    rig = get_rig()
+    if not rig.board_manager.camera_board or not rig.board_manager.camera_board.is_alive():
+        return jsonify({"error": "Camera not connected"}), 503
+
+    data = request.get_json(silent=True) or {}
+    settings = CaptureSettings(framesize=data.get('framesize'), exposure=data.get('exposure'))
+    if settings.framesize is not None and settings.framesize not in FRAMESIZES:
+        return jsonify({"error": f"Unknown framesize: {settings.framesize}"}), 400
+
+    success, error = rig.scan_manager.capture_background(settings)
+    if not success:
+        return jsonify({"error": error}), 500
+    return jsonify({"message": "Background reference captured"})
 
-@app.route('/api/motor', methods=['POST'])
+@api.route('/api/motor', methods=['POST'])
+@lane('io')
 def control_motor():
+    board_manager = get_rig().board_manager
     # Check if controller is connected
     if not board_manager.controller_board or not board_manager.controller_board.is_alive():
         return jsonify({"error": "Controller not connected"}), 503
@@ -199,31 +387,138 @@ def control_motor():
 
     try:
         # Send motor control command to controller
-        response = requests.post(
-            f"http://{board_manager.controller_board.ip_address}/motor",
-            json={"angle": angle, "relative": is_relative},
-            headers={"Authorization": f"Bearer {board_manager.controller_board.token}"},
-            timeout=5
+        response = board_manager.post(
+            board_manager.controller_board,
+            "/motor",
+            json={"angle": angle, "relative": is_relative}
         )
         if response.status_code != 200:
             return jsonify({"error": "Failed to control motor"}), 500
-            
+
         return response.json()  # Return the new angle from controller
     except Exception as e:
         return jsonify({"error": f"Controller error: {str(e)}"}), 500
 
-@app.route('/api/upload', methods=['POST'])
+@api.route('/api/upload', methods=['POST'])
+@lane('io', shed=False)
 def upload_image():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not board_manager.camera_board or token != board_manager.camera_board.token:
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_camera(get_token()):
         return jsonify({"error": "Unauthorized"}), 401
 
     if 'image' not in request.files:
         return jsonify({"error": "No image file provided"}), 400
 
     image = request.files['image']
-    scan_manager.save_photo(image.filename, image)
+    rig.scan_manager.save_photo(image.filename, image, rig.scan_manager.session)
     return jsonify({"message": f"Image {image.filename} uploaded successfully"}), 200
 
+@api.route('/api/uploads', methods=['POST'])
+@lane('io')
+def begin_upload():
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_camera(get_token()):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    step = data.get('step', 0)
+    size = data.get('size')
+    if not isinstance(step, int) or (size is not None and (not isinstance(size, int) or size <= 0)):
+        return jsonify({"error": "Invalid step or size"}), 400
+
+    return jsonify(rig.scan_manager.begin_upload(step, size)), 201
+
+@api.route('/api/uploads/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_camera(get_token()):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    meta = rig.scan_manager.get_upload(upload_id)
+    if not meta:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify(meta)
+
+@api.route('/api/uploads/<upload_id>', methods=['PATCH'])
+@lane('io')
+def write_upload(upload_id):
+    # Raw application/octet-stream body appended at Upload-Offset; no form parsing or spooling
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_camera(get_token()):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    if request.mimetype != 'application/octet-stream':
+        return jsonify({"error": "Expected application/octet-stream"}), 415
+
+    meta = rig.scan_manager.get_upload(upload_id)
+    if not meta:
+        return jsonify({"error": "Unknown upload"}), 404
+
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+    except ValueError:
+        return jsonify({"error": "Missing or invalid Upload-Offset header"}), 400
+
+    if offset != meta["offset"]:
+        return jsonify({"error": "Offset mismatch", "offset": meta["offset"]}), 409
+    if meta.get("size") is not None and offset + (request.content_length or 0) > meta["size"]:
+        return jsonify({"error": "Chunk exceeds declared size", "offset": meta["offset"]}), 413
+
+    try:
+        new_offset = rig.scan_manager.write_upload(upload_id, offset, request.stream, meta.get("size"))
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e), "offset": rig.scan_manager.get_upload(upload_id)["offset"]}), 413
+    except ValueError as e:
+        return jsonify({"error": str(e), "offset": rig.scan_manager.get_upload(upload_id)["offset"]}), 409
+    return jsonify({"upload_id": upload_id, "offset": new_offset})
+
+@api.route('/api/uploads/<upload_id>/commit', methods=['POST'])
+@lane('io')
+def commit_upload(upload_id):
+    rig = get_board_rig()
+    if not rig or not rig.board_manager.is_camera(get_token()):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    path, error = rig.scan_manager.commit_upload(upload_id, data.get('sha256'))
+    if error:
+        return jsonify({"error": error}), 404 if error == "Unknown upload" else 409
+    return jsonify({"message": f"Upload {upload_id} committed", "filename": os.path.basename(path)})
+
+def create_app(config: Optional[Config] = None, http=None,
+               storage_factory: Callable[[str], PhotoStorage] = PhotoStorage,
+               scheduler: Optional[ProcessingScheduler] = None,
+               pyramid: Optional[PyramidBuilder] = None) -> Flask:
+    config = config or Config()
+    scheduler = scheduler or ProcessingScheduler(config.photogrammetry_command, config.processing_workers)
+    pyramid = pyramid or PyramidBuilder(os.path.join(config.upload_folder, '.pyramid_cache'), config.pyramid_workers)
+
+    recorder = TrafficRecorder(config.record_file) if config.record_file else None
+    if recorder:
+        http = RecordingHttp(http if http is not None else requests.Session(), recorder)
+
+    app = Flask(__name__)
+    app.config['PHOTOGRAMMETRY'] = config
+
+    rig_manager = RigManager(config, http=http, scheduler=scheduler, storage_factory=storage_factory,
+                             pyramid=pyramid, registry=BoardRegistry(config.registry_file))
+    rig_manager.get_or_create(config.default_rig)
+    rig_manager.restore()
+    if recorder:
+        recorder.record_boards(rig_manager.all())
+    app.extensions['rig_manager'] = rig_manager
+    app.extensions['scheduler'] = scheduler
+    app.extensions['profiles'] = load_profiles(config.profiles_file)
+    app.extensions['profiler'] = RequestProfiler()
+    app.extensions['recorder'] = recorder
+    app.extensions['lanes'] = RequestLanes({
+        "control": Lane("control"),
+        "io": Lane("io", config.io_lane_workers, config.io_lane_queue, config.lane_timeout)
+    })
+
+    app.register_blueprint(api)
+    return app
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8888)
+    config = Config.from_env()
+    create_app(config).run(host=config.host, port=config.port)
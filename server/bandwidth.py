@@ -0,0 +1,120 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from profiles import FRAMESIZES, CaptureSettings
+
+# Pixels per frame for each framesize the camera firmware accepts
+FRAMESIZE_PIXELS = {
+    "QVGA": 320 * 240,
+    "VGA": 640 * 480,
+    "SVGA": 800 * 600,
+    "XGA": 1024 * 768,
+    "HD": 1280 * 720,
+    "SXGA": 1280 * 1024,
+    "UXGA": 1600 * 1200
+}
+DEFAULT_FRAMESIZE = "SVGA"  # What the camera firmware starts with
+DEFAULT_QUALITY = 12        # OV2640 JPEG quality 0-63, lower is better
+QUALITY_STEPS = (10, 12, 15, 20, 25)  # Tried from the ring's quality towards worse ones before shrinking the frame
+QUALITY_EXPONENT = 0.7      # Rough fit of JPEG size against the quality setting: size ~ q^-0.7
+SMOOTHING = 0.3             # Weight of the newest sample in the moving estimates
+WINDOW = 16                 # Recent transfers used to split fixed latency from throughput
+UPGRADE_MARGIN = 0.8        # A better setting must fit well within the target before switching back up
+
+def quality_factor(quality: int) -> float:
+    return (DEFAULT_QUALITY / max(1, quality)) ** QUALITY_EXPONENT
+
+def smooth(previous: Optional[float], value: float) -> float:
+    return value if previous is None else previous + SMOOTHING * (value - previous)
+
+class TransferEstimator:
+    # Moving estimate of one camera's capture round trip: fixed latency (trigger, exposure,
+    # request overhead) plus JPEG bytes over the link's throughput
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: deque = deque(maxlen=WINDOW)
+        self.latency: Optional[float] = None
+        self.throughput: Optional[float] = None       # Bytes per second
+        self.bytes_per_pixel: Optional[float] = None  # At DEFAULT_QUALITY
+        # Settings of the last capture; the camera falls back to its defaults for any a request leaves out
+        self.framesize = DEFAULT_FRAMESIZE
+        self.quality = DEFAULT_QUALITY
+
+    def sent(self, request: Dict) -> None:
+        with self.lock:
+            self.framesize = request.get("framesize", DEFAULT_FRAMESIZE)
+            self.quality = request.get("quality", DEFAULT_QUALITY)
+
+    def observe(self, size: int, elapsed: float) -> None:
+        if size <= 0 or elapsed <= 0:
+            return
+        with self.lock:
+            self.samples.append((size, elapsed))
+            latency, throughput = self.fit()
+            self.latency = smooth(self.latency, latency)
+            self.throughput = smooth(self.throughput, throughput)
+            pixels = FRAMESIZE_PIXELS.get(self.framesize, FRAMESIZE_PIXELS[DEFAULT_FRAMESIZE])
+            self.bytes_per_pixel = smooth(self.bytes_per_pixel, size / pixels / quality_factor(self.quality))
+
+    def fit(self) -> Tuple[float, float]:
+        # Least squares of elapsed = latency + size / throughput over the window. Photos of one
+        # setting are all about the same size, so until sizes vary the latency estimate is kept
+        # and the rest of the time is put down to the transfer
+        sizes = [size for size, _ in self.samples]
+        times = [elapsed for _, elapsed in self.samples]
+        mean_size = sum(sizes) / len(sizes)
+        mean_time = sum(times) / len(times)
+        variance = sum((size - mean_size) ** 2 for size in sizes)
+        if len(sizes) >= 3 and variance > (0.1 * mean_size) ** 2 * len(sizes):
+            slope = sum((size - mean_size) * (elapsed - mean_time) for size, elapsed in self.samples) / variance
+            intercept = mean_time - slope * mean_size
+            if slope > 0 and 0 <= intercept < mean_time:
+                return intercept, 1 / slope
+
+        size, elapsed = self.samples[-1]
+        latency = min(self.latency or 0.0, 0.9 * elapsed)
+        return latency, size / (elapsed - latency)
+
+    def predict(self, framesize: str, quality: int) -> Optional[float]:
+        with self.lock:
+            if self.throughput is None or self.bytes_per_pixel is None:
+                return None
+            size = FRAMESIZE_PIXELS[framesize] * self.bytes_per_pixel * quality_factor(quality)
+            return self.latency + size / self.throughput
+
+    def choose(self, requested: CaptureSettings, target: float,
+               current: Optional[CaptureSettings] = None) -> CaptureSettings:
+        # The ring's framesize and quality are the best this may pick; quality gives way before
+        # resolution does. Without samples yet the ring's settings are sent as they are
+        candidates = self.candidates(requested)
+        if self.predict(*candidates[0]) is None:
+            return CaptureSettings(framesize=candidates[0][0], exposure=requested.exposure, quality=candidates[0][1])
+
+        current_rank = candidates.index((current.framesize, current.quality)) \
+            if current and (current.framesize, current.quality) in candidates else len(candidates)
+        chosen = candidates[-1]
+        for rank, candidate in enumerate(candidates):
+            # Hysteresis: stepping back up needs headroom, so a noisy link doesn't flip settings every shot
+            limit = target * UPGRADE_MARGIN if rank < current_rank else target
+            if self.predict(*candidate) <= limit:
+                chosen = candidate
+                break
+        return CaptureSettings(framesize=chosen[0], exposure=requested.exposure, quality=chosen[1])
+
+    def candidates(self, requested: CaptureSettings) -> List[Tuple[str, int]]:
+        framesize = requested.framesize or DEFAULT_FRAMESIZE
+        best_quality = requested.quality if requested.quality is not None else DEFAULT_QUALITY
+        qualities = [best_quality] + [quality for quality in QUALITY_STEPS if quality > best_quality]
+        sizes = reversed(FRAMESIZES[:FRAMESIZES.index(framesize) + 1])
+        return [(size, quality) for size in sizes for quality in qualities]
+
+    def get_status(self) -> Dict:
+        with self.lock:
+            return {
+                "samples": len(self.samples),
+                "latency": round(self.latency, 4) if self.latency is not None else None,
+                "throughput": round(self.throughput) if self.throughput is not None else None,
+                "bytes_per_pixel": round(self.bytes_per_pixel, 4) if self.bytes_per_pixel is not None else None,
+                "framesize": self.framesize,
+                "quality": self.quality
+            }
@@ -1,10 +1,18 @@
 import secrets
+import time
 from typing import Optional, Dict
 import requests
-from models import Board
+from models import Board, hash_token
+from tracing import ScanTracer
 
 class BoardManager:
-    def __init__(self):
+    def __init__(self, http=None, http_timeout: float = 5, board_timeout: float = 30,
+                 tracer: Optional[ScanTracer] = None):
+        # Any object with a requests-compatible post() works, e.g. a Session or a test double
+        self.http = http if http is not None else requests.Session()
+        self.tracer = tracer or ScanTracer()
+        self.http_timeout = http_timeout
+        self.board_timeout = board_timeout
         self.camera_board: Optional[Board] = None
         self.controller_board: Optional[Board] = None
 
@@ -13,59 +21,118 @@ class BoardManager:
 
     def register_board(self, board_type: str, ip_address: str) -> Board:
         token = self.generate_token()
-        new_board = Board(ip_address=ip_address, token=token, last_seen=0)
-        
-        if board_type == "camera":
-            self.camera_board = new_board
-        elif board_type == "controller":
-            self.controller_board = new_board
-        else:
-            raise ValueError(f"Invalid board type: {board_type}")
-        
+        new_board = Board(
+            ip_address=ip_address,
+            token=token,
+            last_seen=0,
+            timeout=self.board_timeout,
+            board_type=board_type,
+            token_hash=hash_token(token)
+        )
+        self.set_board(new_board)
         return new_board
 
-    def update_heartbeat(self, token: str) -> bool:
-        import time
-        current_time = time.time()
+    def restore_board(self, board_type: str, ip_address: str, token_hash: str,
+                      last_seen: float, telemetry: Optional[Dict] = None) -> Board:
+        # The token itself isn't stored; the board's next heartbeat proves it and hands it back
+        board = Board(
+            ip_address=ip_address,
+            token="",
+            last_seen=last_seen,
+            timeout=self.board_timeout,
+            board_type=board_type,
+            token_hash=token_hash,
+            telemetry=telemetry or {}
+        )
+        self.set_board(board)
+        return board
+
+    def set_board(self, board: Board) -> None:
+        if board.board_type == "camera":
+            self.camera_board = board
+        elif board.board_type == "controller":
+            self.controller_board = board
+        else:
+            raise ValueError(f"Invalid board type: {board.board_type}")
+
+    def update_heartbeat(self, token: str, telemetry: Optional[Dict] = None) -> bool:
+        board = self.get_board_by_token(token)
+        if not board:
+            return False
 
-        if self.camera_board and token == self.camera_board.token:
-            self.camera_board.last_seen = current_time
-            return True
-        elif self.controller_board and token == self.controller_board.token:
-            self.controller_board.last_seen = current_time
-            return True
-        
-        return False
+        board.last_seen = time.time()
+        if telemetry:
+            board.telemetry = telemetry
+        return True
 
     def get_board_by_token(self, token: str) -> Optional[Board]:
-        if self.camera_board and token == self.camera_board.token:
-            return self.camera_board
-        elif self.controller_board and token == self.controller_board.token:
-            return self.controller_board
+        for board in (self.camera_board, self.controller_board):
+            if board and board.matches(token):
+                if not board.token:
+                    board.token = token
+                return board
         return None
 
+    def is_camera(self, token: str) -> bool:
+        return self.camera_board is not None and self.camera_board.matches(token)
+
+    def is_controller(self, token: str) -> bool:
+        return self.controller_board is not None and self.controller_board.matches(token)
+
+    def prewarm(self) -> None:
+        # Open a pooled connection to every known board so the first real call skips connection setup
+        adapter_for = getattr(self.http, "get_adapter", None)
+        if adapter_for is None:
+            return
+        for board in (self.camera_board, self.controller_board):
+            if not board:
+                continue
+            url = f"http://{board.ip_address}/"
+            try:
+                pool = adapter_for(url).poolmanager.connection_from_url(url)
+                pool.urlopen("HEAD", "/", retries=False, timeout=self.http_timeout)
+            except Exception as e:
+                print(f"Could not reach {board.board_type} board at {board.ip_address}: {e}")
+
+    def post(self, board: Board, path: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.http_timeout)
+        with self.tracer.span(f"POST {path}", "http", board=board.ip_address) as span:
+            response = self.http.post(
+                f"http://{board.ip_address}{path}",
+                headers={"Authorization": f"Bearer {board.token}"},
+                **kwargs
+            )
+            span["status_code"] = response.status_code
+            span["bytes"] = len(response.content or b"")
+            return response
+
     def update_lcd(self, line1: str = None, line2: str = None) -> bool:
         if not self.controller_board or not self.controller_board.is_alive():
             print(f"Controller not connected, can't update LCD: {line1} / {line2}")
             return False
-        
+
         try:
-            response = requests.post(
-                f"http://{self.controller_board.ip_address}/lcd",
+            response = self.post(
+                self.controller_board,
+                "/lcd",
                 json={
                     "lines": [
                         line1 if line1 is not None else "",
                         line2 if line2 is not None else ""
                     ]
-                },
-                headers={"Authorization": f"Bearer {self.controller_board.token}"},
-                timeout=5
+                }
             )
             return response.status_code == 200
         except Exception as e:
             print(f"Failed to update LCD: {e}")
             return False
 
+    def get_telemetry(self) -> Dict[str, Dict]:
+        return {
+            board.board_type: board.telemetry
+            for board in (self.camera_board, self.controller_board) if board
+        }
+
     def get_status(self) -> Dict[str, str]:
         return {
             "camera": "connected" if self.camera_board and self.camera_board.is_alive() else "disconnected",
@@ -74,24 +141,16 @@ class BoardManager:
 
     def send_abort(self) -> Dict[str, list]:
         errors = []
-        
+
         if self.controller_board and self.controller_board.is_alive():
             try:
-                requests.post(
-                    f"http://{self.controller_board.ip_address}/abort",
-                    headers={"Authorization": f"Bearer {self.controller_board.token}"},
-                    timeout=5
-                )
+                self.post(self.controller_board, "/abort")
             except Exception as e:
                 errors.append(f"Controller abort failed: {str(e)}")
 
         if self.camera_board and self.camera_board.is_alive():
             try:
-                requests.post(
-                    f"http://{self.camera_board.ip_address}/abort",
-                    headers={"Authorization": f"Bearer {self.camera_board.token}"},
-                    timeout=5
-                )
+                self.post(self.camera_board, "/abort")
             except Exception as e:
                 errors.append(f"Camera abort failed: {str(e)}")
 
@@ -1,13 +1,21 @@
 #!/usr/bin/env python3
+import argparse
+import os
 import requests
 import json
 import sys
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+
+DEFAULT_URL = os.environ.get("PHOTOGRAMMETRY_URL", "http://localhost:8888/api")
 
 class PhotogrammetryCLI:
-    def __init__(self):
-        self.base_url = "http://localhost:8888/api"
+    def __init__(self, base_url: str = DEFAULT_URL, rig: Optional[str] = None, output_json: bool = False):
+        self.base_url = base_url.rstrip("/")
+        self.rig = rig
+        self.output_json = output_json
+        # One keep-alive connection for every call instead of a new socket per request
+        self.session = requests.Session()
         self.menu_options = {
             "1": ("Check Status", self.check_status),
             "2": ("Start Scan", self.start_scan),
@@ -21,28 +29,29 @@ class PhotogrammetryCLI:
 
     def make_request(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         url = f"{self.base_url}/{endpoint}"
+        params = {"rig": self.rig} if self.rig else None
         try:
             if method == "GET":
-                response = requests.get(url)
+                response = self.session.get(url, params=params)
             elif method == "POST":
-                response = requests.post(url, json=data)
+                response = self.session.post(url, json=data, params=params)
             else:
                 raise ValueError(f"Unsupported HTTP method: {method}")
 
             response.raise_for_status()
             return response.json()
         except requests.exceptions.ConnectionError:
-            print("Error: Could not connect to server. Is it running?")
+            print("Error: Could not connect to server. Is it running?", file=sys.stderr)
             return {"error": "Connection failed"}
         except requests.exceptions.HTTPError as e:
-            print(f"Error: Server {url} returned {e.response.status_code}")
+            print(f"Error: Server {url} returned {e.response.status_code}", file=sys.stderr)
             try:
                 error_data = e.response.json()
                 return {"error": error_data.get("error", str(e))}
             except ValueError:  # Includes JSONDecodeError
                 return {"error": e.response.text if e.response.text else str(e)}
         except Exception as e:
-            print(f"Error: {str(e)}")
+            print(f"Error: {str(e)}", file=sys.stderr)
             return {"error": str(e)}
 
     def display_menu(self):
@@ -271,6 +280,230 @@ class PhotogrammetryCLI:
             else:
                 print("Invalid choice")
 
+    # Non-interactive commands: no prompts, optional JSON output, non-zero exit on errors
+
+    def emit(self, result: Any, text: Optional[str] = None) -> int:
+        failed = isinstance(result, dict) and "error" in result
+        if self.output_json:
+            print(json.dumps(result, indent=2))
+        elif failed:
+            print(f"Error: {result['error']}", file=sys.stderr)
+        elif text is not None:
+            print(text)
+        return 1 if failed else 0
+
+    def render_progress(self, status: Dict[str, Any]) -> str:
+        scan = status.get("scan") or {}
+        done = len(scan.get("completed_steps", []))
+        failed = len(scan.get("failed_steps", []))
+        total = scan.get("total_steps")
+        last = scan["completed_steps"][-1] if scan.get("completed_steps") else "-"
+        if total:
+            filled = int(30 * done / total)
+            bar = f"[{'#' * filled}{'-' * (30 - filled)}] {done}/{total}"
+        else:
+            bar = f"{done} photos"
+        return f"{scan.get('scan_id', '-')} {status['scan_status']:<11} {bar} step {last} failed {failed}"
+
+    def wait_for_scan(self, watch: bool, interval: float = 1.0) -> Dict[str, Any]:
+        while True:
+            status = self.make_request("GET", "status")
+            if "error" in status:
+                return status
+            if watch and not self.output_json:
+                sys.stdout.write("\r\033[K" + self.render_progress(status))
+                sys.stdout.flush()
+            if status["scan_status"] not in ("scanning", "calibrating"):
+                if watch and not self.output_json:
+                    print()
+                return status
+            time.sleep(interval)
+
+    def wait_for_jobs(self, job_ids: List[str], interval: float = 2.0) -> Any:
+        while True:
+            jobs = self.make_request("GET", "jobs")
+            if isinstance(jobs, dict) and "error" in jobs:
+                return jobs
+            pending = [job for job in jobs
+                       if (not job_ids or job["job_id"] in job_ids) and job["status"] not in ("done", "failed")]
+            if not pending:
+                return [job for job in jobs if not job_ids or job["job_id"] in job_ids]
+            time.sleep(interval)
+
+    def cmd_status(self, args) -> int:
+        result = self.make_request("GET", "status")
+        if "error" in result:
+            return self.emit(result)
+        return self.emit(result, (
+            f"Camera: {result['camera']}\n"
+            f"Controller: {result['controller']}\n"
+            f"Scan Status: {result['scan_status']}"
+        ))
+
+    def cmd_start(self, args) -> int:
+        wait = args.wait or args.watch
+        result = self.run_scan(args.profile, wait, args.watch)
+        if "error" in result or not wait:
+            return self.emit(result, "Scan started")
+        return self.emit(result, f"Scan {result.get('scan_id')} complete: {len(result.get('completed_steps', []))} photos")
+
+    def run_scan(self, profile: Optional[str], wait: bool, watch: bool) -> Dict[str, Any]:
+        data = {"profile": profile} if profile else None
+        result = self.make_request("POST", "start", data)
+        if "error" in result or not wait:
+            return result
+
+        status = self.wait_for_scan(watch)
+        if "error" in status:
+            return status
+        scan = status.get("scan") or {}
+        if scan.get("status") not in (None, "complete"):
+            return {"error": f"Scan {scan.get('scan_id')} {scan.get('status')}", "scan": scan}
+        return scan
+
+    def cmd_batch(self, args) -> int:
+        # Scans run back to back; each one must finish before the next is started
+        profiles = args.profiles or [None]
+        runs = []
+        for _ in range(args.repeat):
+            for profile in profiles:
+                if not self.output_json:
+                    print(f"Starting scan {len(runs) + 1}: {profile or 'firmware'}")
+                result = self.run_scan(profile, True, args.watch)
+                runs.append({"profile": profile, "scan_id": result.get("scan_id"), "error": result.get("error")})
+                if "error" in result:
+                    if not self.output_json:
+                        print(f"Error: {result['error']}", file=sys.stderr)
+                    if not args.keep_going:
+                        return self.emit({"error": "Batch stopped after a failed scan", "runs": runs})
+
+        failed = [run for run in runs if run["error"]]
+        if failed:
+            return self.emit({"error": f"{len(failed)} of {len(runs)} scans failed", "runs": runs})
+        return self.emit({"runs": runs}, f"{len(runs)} scans completed")
+
+    def cmd_resume(self, args) -> int:
+        result = self.make_request("POST", "resume", {"scan_id": args.scan_id} if args.scan_id else None)
+        if "error" in result or not (args.wait or args.watch):
+            return self.emit(result, f"Scan {(result.get('scan') or {}).get('scan_id')} resumed")
+        status = self.wait_for_scan(args.watch)
+        return self.emit(status, self.render_progress(status) if "error" not in status else None)
+
+    def cmd_abort(self, args) -> int:
+        result = self.make_request("POST", "abort")
+        return self.emit(result, "Scan aborted successfully")
+
+    def cmd_capture(self, args) -> int:
+        result = self.make_request("POST", "capture_single")
+        return self.emit(result, "Photo captured successfully")
+
+    def cmd_background(self, args) -> int:
+        data = {"framesize": args.framesize} if args.framesize else None
+        result = self.make_request("POST", "background", data)
+        return self.emit(result, "Background reference captured")
+
+    def cmd_motor(self, args) -> int:
+        result = self.make_request("POST", "motor", {"angle": args.angle, "relative": args.relative})
+        if "error" in result:
+            return self.emit(result)
+        return self.emit(result, f"Motor moved to {result.get('angle', args.angle)}°")
+
+    def cmd_watch(self, args) -> int:
+        status = self.wait_for_scan(True, args.interval)
+        return self.emit(status, self.render_progress(status) if "error" not in status else None)
+
+    def cmd_scans_ls(self, args) -> int:
+        scans = self.make_request("GET", "scans")
+        if isinstance(scans, dict):
+            return self.emit(scans)
+        lines = [f"{scan['scan_id']}  {scan['status']:<9} {scan['profile'] or 'firmware':<12} "
+                 f"{len(scan['completed_steps'])}/{scan['total_steps'] or '?'} photos  job {scan['job_id'] or '-'}"
+                 for scan in scans]
+        return self.emit(scans, "\n".join(lines) if lines else "No scans")
+
+    def cmd_jobs_ls(self, args) -> int:
+        jobs = self.make_request("GET", "jobs")
+        if isinstance(jobs, dict):
+            return self.emit(jobs)
+        lines = [f"{job['job_id']}  {job['rig_id']:<10} {job['status']}" for job in jobs]
+        return self.emit(jobs, "\n".join(lines) if lines else "No jobs")
+
+    def cmd_jobs_wait(self, args) -> int:
+        jobs = self.wait_for_jobs(args.job_ids, args.interval)
+        if isinstance(jobs, dict):
+            return self.emit(jobs)
+        failed = [job for job in jobs if job["status"] == "failed"]
+        if failed:
+            return self.emit({"error": f"{len(failed)} jobs failed", "jobs": jobs})
+        return self.emit(jobs, f"{len(jobs)} jobs done")
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Photogrammetry rig control. Without a command the interactive menu starts.")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Server API URL (env PHOTOGRAMMETRY_URL)")
+    parser.add_argument("--rig", help="Rig to address, the server's default rig if omitted")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON responses")
+    commands = parser.add_subparsers(dest="command")
+
+    commands.add_parser("status", help="Show board and scan status").set_defaults(handler="cmd_status")
+
+    start = commands.add_parser("start", help="Start a scan")
+    start.add_argument("--profile", help="Scan profile, firmware-driven rotation if omitted")
+    start.add_argument("--wait", action="store_true", help="Block until the scan has finished")
+    start.add_argument("--watch", action="store_true", help="Wait and render live progress")
+    start.set_defaults(handler="cmd_start")
+
+    batch = commands.add_parser("batch", help="Run several scans back to back")
+    batch.add_argument("profiles", nargs="*", help="Profiles to scan in order")
+    batch.add_argument("--repeat", type=int, default=1, help="Run the list this many times")
+    batch.add_argument("--keep-going", action="store_true", help="Continue after a failed scan")
+    batch.add_argument("--watch", action="store_true", help="Render live progress")
+    batch.set_defaults(handler="cmd_batch")
+
+    resume = commands.add_parser("resume", help="Resume an interrupted scan")
+    resume.add_argument("scan_id", nargs="?", help="Scan to resume, defaults to the latest interrupted one")
+    resume.add_argument("--wait", action="store_true", help="Block until the scan has finished")
+    resume.add_argument("--watch", action="store_true", help="Wait and render live progress")
+    resume.set_defaults(handler="cmd_resume")
+
+    commands.add_parser("abort", help="Abort the running scan").set_defaults(handler="cmd_abort")
+    commands.add_parser("capture", help="Take a single photo").set_defaults(handler="cmd_capture")
+
+    background = commands.add_parser("background", help="Capture the empty turntable as the masking reference")
+    background.add_argument("--framesize", help="Camera frame size, the camera default if omitted")
+    background.set_defaults(handler="cmd_background")
+
+    motor = commands.add_parser("motor", help="Move the turntable")
+    motor.add_argument("angle", type=int, help="Absolute angle 0-359, or -360..360 with --relative")
+    motor.add_argument("--relative", action="store_true", help="Move relative to the current angle")
+    motor.set_defaults(handler="cmd_motor")
+
+    watch = commands.add_parser("watch", help="Render live progress of the running scan")
+    watch.add_argument("--interval", type=float, default=1.0)
+    watch.set_defaults(handler="cmd_watch")
+
+    scans = commands.add_parser("scans", help="Scan sessions").add_subparsers(dest="scans_command", required=True)
+    scans.add_parser("ls", help="List scans").set_defaults(handler="cmd_scans_ls")
+
+    jobs = commands.add_parser("jobs", help="Processing jobs").add_subparsers(dest="jobs_command", required=True)
+    jobs.add_parser("ls", help="List processing jobs").set_defaults(handler="cmd_jobs_ls")
+    jobs_wait = jobs.add_parser("wait", help="Block until processing jobs are done")
+    jobs_wait.add_argument("job_ids", nargs="*", help="Jobs to wait for, all jobs if omitted")
+    jobs_wait.add_argument("--interval", type=float, default=2.0)
+    jobs_wait.set_defaults(handler="cmd_jobs_wait")
+
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    cli = PhotogrammetryCLI(args.url, args.rig, args.json)
+    if not args.command:
+        cli.run()
+        return 0
+    try:
+        return getattr(cli, args.handler)(args)
+    except KeyboardInterrupt:
+        print("\nInterrupted", file=sys.stderr)
+        return 130
+
 if __name__ == "__main__":
-    cli = PhotogrammetryCLI()
-    cli.run()
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import os
+import re
+from dataclasses import dataclass, replace
+from typing import Optional, Tuple
+
+RIG_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,32}$')
+
+def parse_ellipse(value: str) -> Tuple[float, float, float, float]:
+    # "cx,cy,rx,ry", each a fraction of the image size
+    try:
+        parts = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        parts = ()
+    if len(parts) != 4 or not all(0 <= part <= 1 for part in parts) or min(parts[2:]) <= 0:
+        raise ValueError(f"Turntable ellipse must be cx,cy,rx,ry as fractions of the image, got {value!r}")
+    return parts
+
+@dataclass
+class Config:
+    upload_folder: str = './uploads'
+    output_folder: str = './output'
+    scan_status_file: str = '.scan_status'
+    settle_file: str = '.settle_times'
+    journal_file: str = '.scan_journal'
+    host: str = '0.0.0.0'
+    port: int = 8888
+    board_timeout: float = 30  # Consider board dead after 30s
+    http_timeout: float = 5
+    motor_timeout: float = 15  # /motor only answers once the turntable stopped moving
+    step_idempotency_ttl: float = 300  # How long a repeated rotation_complete gets the first one's result
+    photogrammetry_command: str = "photogrammetry-tool --input {input} --output {output}"  # {priors}: pose priors folder
+    processing_workers: int = 2  # Reconstruction jobs running at once, shared by all rigs (the cpu lane)
+    pyramid_workers: int = 2  # Processes producing downscaled copies of new photos
+    # Request lanes: captures and uploads (io) run at most this many at once with this many more queued,
+    # so heartbeats, aborts and status (control) are never stuck behind them. A full queue answers 429,
+    # a request that waited lane_timeout seconds for a slot 503; board callbacks always wait instead
+    io_lane_workers: int = 4
+    io_lane_queue: int = 8
+    lane_timeout: float = 30
+    upload_expiry: float = 24 * 3600  # Unfinished resumable uploads idle this long are deleted
+    default_rig: str = 'default'
+    profiles_file: str = './profiles.json'  # Extra scan profiles on top of the built-in ones
+    registry_file: str = './boards.db'  # Registered boards, so they survive a restart
+    # Turntable disc in the camera image as (centre x, centre y, radius x, radius y), fractions of
+    # the image size. When set, step angles are refined from the photos; otherwise nominal angles are used
+    turntable_ellipse: Optional[Tuple[float, float, float, float]] = None
+    record_file: Optional[str] = None  # Record board traffic here for replay.py when set
+
+    @classmethod
+    def from_env(cls) -> 'Config':
+        # What a deployment sets without editing code
+        config = cls(record_file=os.environ.get('PHOTOGRAMMETRY_RECORD'))
+        if os.environ.get('PHOTOGRAMMETRY_COMMAND'):
+            config.photogrammetry_command = os.environ['PHOTOGRAMMETRY_COMMAND']
+        if os.environ.get('PHOTOGRAMMETRY_TURNTABLE'):
+            config.turntable_ellipse = parse_ellipse(os.environ['PHOTOGRAMMETRY_TURNTABLE'])
+        return config
+
+    def for_rig(self, rig_id: str) -> 'Config':
+        if not RIG_ID_PATTERN.match(rig_id):
+            raise ValueError(f"Invalid rig id: {rig_id}")
+
+        # Every rig gets its own storage namespace, scan status, journal and settle calibration
+        return replace(
+            self,
+            upload_folder=os.path.join(self.upload_folder, rig_id),
+            output_folder=os.path.join(self.output_folder, rig_id),
+            scan_status_file=f"{self.scan_status_file}_{rig_id}",
+            settle_file=f"{self.settle_file}_{rig_id}",
+            journal_file=f"{self.journal_file}_{rig_id}"
+        )
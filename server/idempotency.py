@@ -0,0 +1,50 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Optional
+
+@dataclass
+class Outcome:
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Any = None
+    expires: Optional[float] = None  # Set once the result is in
+
+class IdempotencyCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.outcomes: Dict[Hashable, Outcome] = {}
+
+    def run(self, key: Hashable, action: Callable[[], Any],
+            succeeded: Callable[[Any], bool] = lambda result: True) -> tuple[Any, bool]:
+        # Returns (result, duplicate). The first call for a key runs the action; calls arriving
+        # while it runs wait for its result, later ones get it from the cache until it expires.
+        # Failed results (and None, if the action raised) are only shared with the calls that waited
+        # on them, so a retry can succeed
+        with self.lock:
+            self.purge()
+            outcome = self.outcomes.get(key)
+            owner = outcome is None
+            if owner:
+                outcome = self.outcomes[key] = Outcome()
+
+        if not owner:
+            outcome.done.wait()
+            return outcome.result, True
+
+        try:
+            outcome.result = action()
+        finally:
+            with self.lock:
+                if outcome.result is not None and succeeded(outcome.result):
+                    outcome.expires = time.monotonic() + self.ttl
+                else:
+                    del self.outcomes[key]
+            outcome.done.set()
+        return outcome.result, False
+
+    def purge(self) -> None:
+        now = time.monotonic()
+        for key in [key for key, outcome in self.outcomes.items()
+                    if outcome.expires is not None and outcome.expires <= now]:
+            del self.outcomes[key]
@@ -0,0 +1,52 @@
+import io
+import struct
+
+# Pillow and NumPy are optional; without them scoring falls back to cheaper proxies
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+def has_image_support() -> bool:
+    return np is not None and Image is not None
+
+def load_grayscale(jpeg: bytes, max_size: int = 640):
+    image = Image.open(io.BytesIO(jpeg))
+    # Let the JPEG decoder skip detail we don't need, which is much faster than a full decode
+    image.draft('L', (max_size, max_size))
+    image = image.convert('L')
+    image.thumbnail((max_size, max_size))
+    return np.asarray(image, dtype=np.float32)
+
+def sharpness(jpeg: bytes) -> float:
+    if not has_image_support():
+        # Motion blur removes high frequencies, and with them JPEG bytes
+        return float(len(jpeg))
+
+    gray = load_grayscale(jpeg)
+    # Variance of the 4-neighbour Laplacian
+    laplacian = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+                 - 4 * gray[1:-1, 1:-1])
+    return float(laplacian.var())
+
+def jpeg_size(path: str) -> tuple[int, int]:
+    # Width and height from the first start-of-frame marker, without decoding (or needing Pillow)
+    with open(path, 'rb') as f:
+        if f.read(2) != b'\xff\xd8':
+            raise ValueError(f"Not a JPEG: {path}")
+        while True:
+            marker = f.read(2)
+            if len(marker) < 2 or marker[0] != 0xFF:
+                raise ValueError(f"No frame header in {path}")
+            if marker[1] in (0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7):
+                continue
+            length, = struct.unpack('>H', f.read(2))
+            if 0xC0 <= marker[1] <= 0xCF and marker[1] not in (0xC4, 0xC8, 0xCC):
+                height, width = struct.unpack('>xHH', f.read(5))
+                return width, height
+            f.seek(length - 2, 1)
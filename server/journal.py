@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, List
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+class ScanJournal:
+    def __init__(self, path: str, sync_interval: float = 0.5):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        self.file = None
+        self.dirty = False
+        self.flusher = None
+        self.lock_file = None
+
+    def claim(self) -> bool:
+        # Held for the life of the process, so a second server over the same journal can tell
+        # that the scans it lists as running are still live. Without fcntl every process owns it
+        if fcntl is None:
+            return True
+        if self.lock_file is None:
+            self.lock_file = open(f"{self.path}.lock", 'a')
+        try:
+            fcntl.lockf(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            return False
+
+    def replay(self) -> List[Dict]:
+        if not os.path.exists(self.path):
+            return []
+
+        events = []
+        with open(self.path, 'r') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    events.append(json.loads(line))
+                except ValueError:
+                    # Only the tail can be torn by a crash mid-write; drop it and carry on
+                    print(f"Skipping unreadable journal line {line_number} in {self.path}")
+        return events
+
+    def append(self, event: str, sync: bool = False, **fields) -> None:
+        record = {"event": event, "time": time.time(), **fields}
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, 'a')
+                # Close off a line torn by a crash so it doesn't swallow the next event
+                if self.file.tell() > 0 and not self.ends_with_newline():
+                    self.file.write("\n")
+            self.file.write(json.dumps(record) + "\n")
+            self.dirty = True
+            if sync:
+                self._sync()
+            elif self.flusher is None:
+                self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self.flusher.start()
+
+    def ends_with_newline(self) -> bool:
+        with open(self.path, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    def sync(self) -> None:
+        with self.lock:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self.file is None or not self.dirty:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.dirty = False
+
+    def _flush_loop(self) -> None:
+        # Per-step events are fsynced in batches instead of one fsync per photo
+        while True:
+            time.sleep(self.sync_interval)
+            self.sync()
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+METRICS_WINDOW = 512  # Recent requests per lane the latency percentiles are taken over
+
+def lane(name: str, shed: bool = True) -> Callable:
+    # Tags a view with the lane it runs in; untagged views run in the control lane. Board callbacks
+    # the firmware never retries pass shed=False: they wait for a slot however long the queue is
+    def tag(view: Callable) -> Callable:
+        view.lane = name
+        view.shed = shed
+        return view
+    return tag
+
+def percentile(values, fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 4)
+
+class Lane:
+    def __init__(self, name: str, workers: Optional[int] = None, queue: int = 0, timeout: float = 10):
+        # workers=None admits everything; otherwise at most `workers` requests run and up to
+        # `queue` more wait for a slot, each for at most `timeout` seconds
+        self.name = name
+        self.workers = workers
+        self.queue = queue
+        self.timeout = timeout
+        self.condition = threading.Condition()
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.max_waiting = 0
+        self.waits: deque = deque(maxlen=METRICS_WINDOW)
+        self.latencies: deque = deque(maxlen=METRICS_WINDOW)
+
+    def enter(self, shed: bool = True) -> Optional[int]:
+        # Returns None once admitted, or the status to answer with: 429 when the queue is full,
+        # 503 when no slot came free in time. Requests that can't be shed never get either
+        started = time.perf_counter()
+        with self.condition:
+            if self.workers is not None and self.active >= self.workers:
+                if shed and self.waiting >= self.queue:
+                    self.rejected += 1
+                    return 429
+                self.waiting += 1
+                self.max_waiting = max(self.max_waiting, self.waiting)
+                try:
+                    admitted = self.condition.wait_for(lambda: self.active < self.workers,
+                                                       self.timeout if shed else None)
+                finally:
+                    self.waiting -= 1
+                if not admitted:
+                    self.timed_out += 1
+                    return 503
+            self.active += 1
+            self.admitted += 1
+            self.waits.append(time.perf_counter() - started)
+        return None
+
+    def leave(self, latency: float) -> None:
+        with self.condition:
+            self.active -= 1
+            self.latencies.append(latency)
+            self.condition.notify()
+
+    def get_metrics(self) -> Dict:
+        with self.condition:
+            return {
+                "workers": self.workers,
+                "queue": self.queue,
+                "active": self.active,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "timed_out": self.timed_out,
+                "wait_p50": percentile(self.waits, 0.5),
+                "wait_p95": percentile(self.waits, 0.95),
+                "latency_p50": percentile(self.latencies, 0.5),
+                "latency_p95": percentile(self.latencies, 0.95)
+            }
+
+class RequestLanes:
+    def __init__(self, lanes: Dict[str, Lane], default: str = "control"):
+        self.lanes = lanes
+        self.default = default
+
+    def get(self, name: Optional[str]) -> Lane:
+        return self.lanes.get(name or self.default, self.lanes[self.default])
+
+    def get_metrics(self) -> Dict[str, Dict]:
+        return {name: lane.get_metrics() for name, lane in self.lanes.items()}
@@ -0,0 +1,121 @@
+import json
+import os
+from typing import Dict, List, Optional
+from imaging import Image, has_image_support, np
+
+WORKING_SIZE = 640      # Masks are computed on a downscaled copy, then scaled back up
+THRESHOLD = 25          # Per-channel difference (0-255) that counts as foreground
+MORPH_RADIUS = 2        # Opening drops speckle noise, closing fills small holes
+MARGIN = 0.04           # Crops keep this fraction of the photo around the foreground
+MIN_FOREGROUND = 0.002  # Below this the mask is treated as a failed detection
+
+def load_rgb(path: str):
+    with Image.open(path) as image:
+        full_size = image.size
+        image.draft('RGB', (WORKING_SIZE, WORKING_SIZE))
+        image = image.convert('RGB')
+        image.thumbnail((WORKING_SIZE, WORKING_SIZE))
+        return np.asarray(image, dtype=np.int16), full_size
+
+def shift_reduce(mask, radius: int, axis: int, combine):
+    # Max/min filter along one axis from shifted views of a padded copy
+    pad = [(0, 0), (0, 0)]
+    pad[axis] = (radius, radius)
+    padded = np.pad(mask, pad, mode='edge')
+    result = mask.copy()
+    for offset in range(2 * radius + 1):
+        window = [slice(None), slice(None)]
+        window[axis] = slice(offset, offset + mask.shape[axis])
+        combine(result, padded[tuple(window)], out=result)
+    return result
+
+def dilate(mask, radius: int):
+    return shift_reduce(shift_reduce(mask, radius, 0, np.logical_or), radius, 1, np.logical_or)
+
+def erode(mask, radius: int):
+    return shift_reduce(shift_reduce(mask, radius, 0, np.logical_and), radius, 1, np.logical_and)
+
+def foreground_mask(photo, reference):
+    difference = np.abs(photo - reference).max(axis=2)
+    mask = difference > THRESHOLD
+    mask = dilate(erode(mask, MORPH_RADIUS), MORPH_RADIUS)
+    return erode(dilate(mask, MORPH_RADIUS), MORPH_RADIUS)
+
+def bounding_box(mask, full_size: tuple[int, int]) -> Optional[List[int]]:
+    rows = np.flatnonzero(mask.any(axis=1))
+    columns = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0:
+        return None
+
+    # Scale from the working copy back to the photo, with a margin around the object
+    width, height = full_size
+    scale_x = width / mask.shape[1]
+    scale_y = height / mask.shape[0]
+    margin_x = int(width * MARGIN)
+    margin_y = int(height * MARGIN)
+    return [
+        max(0, int(columns[0] * scale_x) - margin_x),
+        max(0, int(rows[0] * scale_y) - margin_y),
+        min(width, int((columns[-1] + 1) * scale_x) + margin_x),
+        min(height, int((rows[-1] + 1) * scale_y) + margin_y)
+    ]
+
+def mask_photo(source: str, reference, output_folder: str) -> Dict:
+    name = os.path.basename(source)
+    photo, full_size = load_rgb(source)
+    if reference.shape != photo.shape:
+        reference = np.asarray(
+            Image.fromarray(reference.astype(np.uint8)).resize((photo.shape[1], photo.shape[0]), Image.BILINEAR),
+            dtype=np.int16
+        )
+
+    mask = foreground_mask(photo, reference)
+    foreground = float(mask.mean())
+    box = bounding_box(mask, full_size) if foreground >= MIN_FOREGROUND else None
+    if box is None:
+        # Nothing found (or the reference doesn't match the shot); pass the photo on uncropped
+        box = [0, 0, full_size[0], full_size[1]]
+        mask = np.ones_like(mask)
+
+    with Image.open(source) as image:
+        image.crop(box).save(os.path.join(output_folder, name), 'JPEG', quality=95)
+
+    mask_name = os.path.join('masks', f"{os.path.splitext(name)[0]}.png")
+    full_mask = Image.fromarray(mask.astype(np.uint8) * 255).resize(full_size, Image.NEAREST)
+    full_mask.crop(box).save(os.path.join(output_folder, mask_name))
+
+    return {
+        "file": name,
+        "source": source,
+        "mask": mask_name,
+        "bbox": box,
+        "size": list(full_size),
+        "foreground": round(foreground, 4)
+    }
+
+def build_masked_input(input_folder: str, reference_path: str, output_folder: str, scan_id: str) -> str:
+    os.makedirs(os.path.join(output_folder, 'masks'), exist_ok=True)
+    reference, _ = load_rgb(reference_path)
+    photos = sorted(name for name in os.listdir(input_folder) if name.lower().endswith('.jpg'))
+
+    entries = []
+    for name in photos:
+        entries.append(mask_photo(os.path.join(input_folder, name), reference, output_folder))
+
+    kept = sum((box[2] - box[0]) * (box[3] - box[1]) for box in (entry["bbox"] for entry in entries))
+    total = sum(width * height for width, height in (entry["size"] for entry in entries))
+    manifest = {
+        "scan_id": scan_id,
+        "reference": reference_path,
+        "threshold": THRESHOLD,
+        "pixels_kept": round(kept / total, 4) if total else None,
+        "photos": entries
+    }
+    manifest_path = os.path.join(output_folder, 'manifest.json')
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Masked {len(entries)} photos for scan {scan_id}, keeping {manifest['pixels_kept']} of the pixels")
+    return manifest_path
+
+def is_available() -> bool:
+    return has_image_support()
@@ -1,13 +1,63 @@
-from dataclasses import dataclass
-from typing import Optional
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import hashlib
 import time
 
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
 @dataclass
 class Board:
     ip_address: str
     token: str
     last_seen: float
     status: str = "idle"
+    timeout: float = 30  # Consider board dead after 30s
+    board_type: str = ""
+    # Boards restored from the registry only know the hash until their next heartbeat
+    token_hash: Optional[str] = None
+    telemetry: Dict = field(default_factory=dict)
 
     def is_alive(self) -> bool:
-        return time.time() - self.last_seen < 30  # Consider board dead after 30s
+        # A restored board can't be called until its heartbeat has handed back the token
+        return bool(self.token) and time.time() - self.last_seen < self.timeout
+
+    def matches(self, token: str) -> bool:
+        if not token:
+            return False
+        if self.token:
+            return token == self.token
+        return hash_token(token) == self.token_hash
+
+@dataclass
+class Job:
+    job_id: str
+    rig_id: str
+    input_folder: str
+    output_folder: str
+    priors_folder: Optional[str] = None
+    status: str = "queued"
+    created: float = 0
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    returncode: Optional[int] = None
+    error: Optional[str] = None
+
+    def is_done(self) -> bool:
+        return self.status in ("done", "failed")
+
+@dataclass
+class ScanSession:
+    scan_id: str
+    rig_id: str
+    folder: str
+    started: float
+    profile: Optional[str] = None  # None when the controller firmware drives the rotation
+    total_steps: Optional[int] = None
+    processing_level: int = 1
+    mask: bool = False
+    completed_steps: List[int] = field(default_factory=list)
+    failed_steps: List[int] = field(default_factory=list)
+    status: str = "scanning"
+    finished: Optional[float] = None
+    job_id: Optional[str] = None
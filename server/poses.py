@@ -0,0 +1,178 @@
+import json
+import math
+import os
+from typing import Dict, List, Optional, Tuple
+from imaging import Image, has_image_support, jpeg_size, np
+
+ANGLE_BINS = 720        # Half-degree resolution around the turntable
+RADIUS_BINS = 64
+INNER_RADIUS = 0.4      # Sample the turntable rim, the object covers the centre...
+OUTER_RADIUS = 0.92     # ...but stay off the disc's edge, which doesn't move
+MIN_CONFIDENCE = 0.03   # Phase correlation peak below which a measurement is ignored
+MAX_DEVIATION = 0.5     # Search window around the commanded step, as a fraction of it (at least 2 degrees)
+FOCAL_GUESS = 1.2       # Initial focal length as a multiple of the longer image side, as COLMAP guesses it
+
+def log_polar(path: str, ellipse: Tuple[float, float, float, float], size: int = 480):
+    with Image.open(path) as image:
+        image.draft('L', (size, size))
+        image = image.convert('L')
+        image.thumbnail((size, size))
+        gray = np.asarray(image, dtype=np.float32)
+
+    # Sampling the ellipse by its parametric angle undoes the camera's foreshortening of the disc
+    height, width = gray.shape
+    cx, cy, rx, ry = ellipse[0] * width, ellipse[1] * height, ellipse[2] * width, ellipse[3] * height
+    theta = np.linspace(0, 2 * np.pi, ANGLE_BINS, endpoint=False)
+    rho = np.exp(np.linspace(np.log(INNER_RADIUS), np.log(OUTER_RADIUS), RADIUS_BINS))
+    xs = np.clip(cx + rx * rho[:, None] * np.cos(theta)[None, :], 0, width - 1.001)
+    ys = np.clip(cy + ry * rho[:, None] * np.sin(theta)[None, :], 0, height - 1.001)
+
+    # Bilinear sampling
+    x0 = xs.astype(np.int32)
+    y0 = ys.astype(np.int32)
+    fx = xs - x0
+    fy = ys - y0
+    top = gray[y0, x0] * (1 - fx) + gray[y0, x0 + 1] * fx
+    bottom = gray[y0 + 1, x0] * (1 - fx) + gray[y0 + 1, x0 + 1] * fx
+    polar = top * (1 - fy) + bottom * fy
+
+    # Angle wraps around, radius doesn't: only the radius axis needs a window
+    polar = polar - polar.mean()
+    return polar * np.hanning(RADIUS_BINS)[:, None]
+
+def phase_correlate(previous, current):
+    spectrum = np.fft.fft2(current) * np.conj(np.fft.fft2(previous))
+    spectrum /= np.abs(spectrum) + 1e-9
+    surface = np.fft.ifft2(spectrum).real
+    # Best match per rotation, whatever the (log) scale change
+    return surface.max(axis=0)
+
+def peak_near(profile, expected: float, tolerance: float) -> Tuple[float, float]:
+    # Static parts of the image (the object's silhouette, the disc's outline) always correlate
+    # at zero rotation, so only the window around the commanded step is searched
+    bins = np.arange(int((expected - tolerance) * ANGLE_BINS / 360), int((expected + tolerance) * ANGLE_BINS / 360) + 1)
+    window = profile[bins % ANGLE_BINS]
+    best = int(np.argmax(window))
+    column = bins[best]
+    confidence = float(window[best])
+
+    # Sub-bin peak position from a parabola through the neighbours
+    left = profile[(column - 1) % ANGLE_BINS]
+    right = profile[(column + 1) % ANGLE_BINS]
+    denominator = left - 2 * confidence + right
+    offset = 0.5 * (left - right) / denominator if denominator else 0.0
+    return float((column + offset) * 360 / ANGLE_BINS), confidence
+
+def nominal_delta(previous: float, current: float) -> float:
+    return (current - previous) % 360
+
+def refine_angles(photos: List[Dict], ellipse: Optional[Tuple[float, float, float, float]]) -> None:
+    # photos are in step order with a nominal "angle"; adds "refined_angle" and "confidence"
+    for photo in photos:
+        photo["refined_angle"] = photo["angle"]
+        photo["confidence"] = None
+    if ellipse is None or not has_image_support() or len(photos) < 2:
+        return
+
+    polar = [log_polar(photo["path"], ellipse) for photo in photos]
+    pairs = list(zip(range(len(photos) - 1), range(1, len(photos))))
+    expected = [nominal_delta(photos[a]["angle"], photos[b]["angle"]) for a, b in pairs]
+    # A scan that goes all the way round can close the loop: the steps have to add up to 360
+    closing = nominal_delta(photos[-1]["angle"], photos[0]["angle"])
+    full_circle = abs(sum(expected) + closing - 360) < 1e-6 and 0 < closing <= max(expected)
+    if full_circle:
+        pairs.append((len(photos) - 1, 0))
+        expected.append(closing)
+
+    profiles = [phase_correlate(polar[a], polar[b]) for a, b in pairs]
+    tolerances = [max(2.0, delta * MAX_DEVIATION) for delta in expected]
+
+    # Which way the disc turns in the image depends on the rig; pick the direction that matches better
+    forward = [peak_near(profile, delta, tolerance)
+               for profile, delta, tolerance in zip(profiles, expected, tolerances)]
+    backward = [peak_near(profile, -delta, tolerance)
+                for profile, delta, tolerance in zip(profiles, expected, tolerances)]
+    if sum(peak[1] for peak in backward) > sum(peak[1] for peak in forward):
+        measured = [(-shift, confidence) for shift, confidence in backward]
+    else:
+        measured = forward
+    measured = [(shift, confidence) if confidence >= MIN_CONFIDENCE else (delta, confidence)
+                for (shift, confidence), delta in zip(measured, expected)]
+
+    if full_circle:
+        # Spread the closing error evenly instead of letting it pile up at the end
+        error = (sum(shift for shift, _ in measured) - 360) / len(measured)
+        measured = [(shift - error, confidence) for shift, confidence in measured]
+
+    angle = photos[0]["angle"]
+    for index in range(1, len(photos)):
+        delta, confidence = measured[index - 1]
+        photos[index]["confidence"] = round(confidence, 4)
+        angle = (angle + delta) % 360
+        photos[index]["refined_angle"] = round(angle, 3)
+
+def camera_rotation(angle: float) -> Tuple[float, float, float, float]:
+    # Turning the object by +angle about the vertical axis is the camera orbiting by -angle,
+    # i.e. a world-to-camera rotation of +angle about Y
+    half = math.radians(angle) / 2
+    return (math.cos(half), 0.0, math.sin(half), 0.0)
+
+def input_camera(name: str, source: str, input_folder: Optional[str], manifest: Dict[str, Dict]) -> Tuple:
+    # Intrinsics of the image the job actually gets: a crop keeps the focal length of the photo it
+    # was cut from, and its principal point moves by the crop offset
+    entry = manifest.get(name)
+    if entry:
+        width, height = entry["size"]
+        box = entry["bbox"]
+    else:
+        path = os.path.join(input_folder, name) if input_folder else source
+        width, height = jpeg_size(path if os.path.exists(path) else source)
+        box = [0, 0, width, height]
+    return (box[2] - box[0], box[3] - box[1], round(FOCAL_GUESS * max(width, height), 2),
+            round(width / 2 - box[0], 2), round(height / 2 - box[1], 2))
+
+def write_priors(photos: List[Dict], folder: str, scan_id: str, input_folder: Optional[str] = None) -> str:
+    os.makedirs(folder, exist_ok=True)
+    manifest_path = os.path.join(input_folder, 'manifest.json') if input_folder else None
+    manifest = {}
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            manifest = {entry["file"]: entry for entry in json.load(f)["photos"]}
+
+    # One camera per distinct image size and principal point
+    cameras: Dict[Tuple, int] = {}
+    poses = []
+    for photo in photos:
+        name = os.path.basename(photo["path"])
+        camera = cameras.setdefault(input_camera(name, photo["path"], input_folder, manifest), len(cameras) + 1)
+        poses.append({
+            "file": name,
+            "camera": camera,
+            "step": photo["step"],
+            "nominal_angle": photo["angle"],
+            "angle": photo["refined_angle"],
+            "confidence": photo["confidence"],
+            "rotation": list(camera_rotation(photo["refined_angle"])),
+            # Unit distance from the turntable axis; scale and camera tilt are left to the solver
+            "translation": [0.0, 0.0, 1.0]
+        })
+
+    with open(os.path.join(folder, 'poses.json'), 'w') as f:
+        json.dump({"scan_id": scan_id, "axis": "y", "poses": poses}, f, indent=2)
+
+    # The same poses as a COLMAP text model without points, for tools that take a prior model
+    with open(os.path.join(folder, 'cameras.txt'), 'w') as f:
+        f.write("# CAMERA_ID, MODEL, WIDTH, HEIGHT, PARAMS[]\n")
+        for (width, height, focal, cx, cy), camera_id in cameras.items():
+            f.write(f"{camera_id} SIMPLE_PINHOLE {width} {height} {focal} {cx} {cy}\n")
+
+    with open(os.path.join(folder, 'images.txt'), 'w') as f:
+        f.write("# IMAGE_ID, QW, QX, QY, QZ, TX, TY, TZ, CAMERA_ID, NAME\n")
+        for image_id, pose in enumerate(poses, 1):
+            qw, qx, qy, qz = pose["rotation"]
+            tx, ty, tz = pose["translation"]
+            f.write(f"{image_id} {qw:.9f} {qx:.9f} {qy:.9f} {qz:.9f} {tx} {ty} {tz} {pose['camera']} {pose['file']}\n\n")
+
+    with open(os.path.join(folder, 'points3D.txt'), 'w') as f:
+        f.write("# POINT3D_ID, X, Y, Z, R, G, B, ERROR, TRACK[] as (IMAGE_ID, POINT2D_IDX)\n")
+    return folder
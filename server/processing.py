@@ -0,0 +1,154 @@
+import shlex
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from lanes import METRICS_WINDOW, percentile
+from models import Job
+
+class ProcessingScheduler:
+    def __init__(self, command: str, workers: int = 2):
+        self.command = command
+        self.worker_count = max(1, workers)
+        self.jobs: Dict[str, Job] = {}
+        self.callbacks: Dict[str, Callable[[Job], None]] = {}
+        self.preparers: Dict[str, Callable[[], Optional[str]]] = {}
+        self.queues: Dict[str, deque] = {}
+        # Rigs with queued jobs, served round-robin so one busy rig can't starve the others
+        self.rig_order: deque = deque()
+        self.condition = threading.Condition()
+        self.workers: List[threading.Thread] = []
+
+    def submit(self, rig_id: str, input_folder: str, output_folder: str,
+               on_done: Optional[Callable[[Job], None]] = None,
+               prepare: Optional[Callable[[], Optional[str]]] = None,
+               priors_folder: Optional[str] = None) -> Job:
+        job = Job(
+            job_id=uuid.uuid4().hex[:12],
+            rig_id=rig_id,
+            input_folder=input_folder,
+            output_folder=output_folder,
+            priors_folder=priors_folder,
+            created=time.time()
+        )
+
+        with self.condition:
+            self.jobs[job.job_id] = job
+            if on_done:
+                self.callbacks[job.job_id] = on_done
+            if prepare:
+                self.preparers[job.job_id] = prepare
+            queue = self.queues.setdefault(rig_id, deque())
+            if not queue and rig_id not in self.rig_order:
+                self.rig_order.append(rig_id)
+            queue.append(job)
+            self._ensure_workers()
+            self.condition.notify()
+
+        print(f"Queued processing job {job.job_id} for rig {rig_id}")
+        return job
+
+    def get_job(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def list_jobs(self, rig_id: Optional[str] = None) -> List[Job]:
+        jobs = sorted(self.jobs.values(), key=lambda job: job.created)
+        return [job for job in jobs if rig_id is None or job.rig_id == rig_id]
+
+    def get_metrics(self) -> Dict:
+        with self.condition:
+            jobs = list(self.jobs.values())
+        finished = sorted((job for job in jobs if job.finished), key=lambda job: job.finished)[-METRICS_WINDOW:]
+        waits = [job.started - job.created for job in finished]
+        latencies = [job.finished - job.started for job in finished]
+        return {
+            "workers": self.worker_count,
+            "active": sum(1 for job in jobs if job.status == "running"),
+            "waiting": sum(1 for job in jobs if job.status == "queued"),
+            "done": sum(1 for job in jobs if job.status == "done"),
+            "failed": sum(1 for job in jobs if job.status == "failed"),
+            "wait_p50": percentile(waits, 0.5),
+            "wait_p95": percentile(waits, 0.95),
+            "latency_p50": percentile(latencies, 0.5),
+            "latency_p95": percentile(latencies, 0.95)
+        }
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        deadline = None if timeout is None else time.time() + timeout
+        with self.condition:
+            job = self.jobs.get(job_id)
+            while job and not job.is_done():
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+        return job
+
+    def _ensure_workers(self) -> None:
+        # Workers are started lazily so idle app instances don't spawn threads
+        while len(self.workers) < self.worker_count:
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self.workers.append(worker)
+
+    def _next_job(self) -> Job:
+        with self.condition:
+            while not self.rig_order:
+                self.condition.wait()
+
+            rig_id = self.rig_order.popleft()
+            queue = self.queues[rig_id]
+            job = queue.popleft()
+            if queue:
+                self.rig_order.append(rig_id)
+
+            job.status = "running"
+            job.started = time.time()
+            return job
+
+    def _work(self) -> None:
+        while True:
+            job = self._next_job()
+            self._run(job)
+
+            with self.condition:
+                job.finished = time.time()
+                callback = self.callbacks.pop(job.job_id, None)
+                self.condition.notify_all()
+
+            print(f"Processing job {job.job_id} for rig {job.rig_id} {job.status}")
+            if callback:
+                try:
+                    callback(job)
+                except Exception as e:
+                    print(f"Processing callback for job {job.job_id} failed: {e}")
+
+    def _run(self, job: Job) -> None:
+        # Inputs that are still being produced (e.g. downscaled copies) are finished on the worker,
+        # which may settle on a different input folder than the one the job was queued with
+        prepare = self.preparers.pop(job.job_id, None)
+        if prepare:
+            try:
+                input_folder = prepare()
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"Preparing input failed: {str(e)}"
+                return
+            if input_folder:
+                job.input_folder = input_folder
+
+        command = self.command.format(
+            input=shlex.quote(job.input_folder),
+            output=shlex.quote(job.output_folder),
+            priors=shlex.quote(job.priors_folder or "")
+        )
+        print(f"Starting photogrammetry processing: {command}")
+        try:
+            result = subprocess.run(shlex.split(command))
+            job.returncode = result.returncode
+            job.status = "done" if result.returncode == 0 else "failed"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
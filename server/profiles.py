@@ -0,0 +1,168 @@
+import json
+import os
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+FRAMESIZES = ("QVGA", "VGA", "SVGA", "XGA", "HD", "SXGA", "UXGA")
+PROCESSING_LEVELS = (1, 2, 4, 8)  # Reconstruct from full size or a 1/2, 1/4 or 1/8 scale copy
+
+@dataclass
+class CaptureSettings:
+    framesize: Optional[str] = None  # One of FRAMESIZES, camera default when unset
+    exposure: Optional[int] = None   # Manual AEC value 0-1200, auto exposure when unset
+    quality: Optional[int] = None    # JPEG quality 0-63 (lower is better), camera default when unset
+
+    def to_request(self) -> Dict[str, object]:
+        return {key: value for key, value in asdict(self).items() if value is not None}
+
+@dataclass
+class Ring:
+    angles: List[float]
+    settings: CaptureSettings = field(default_factory=CaptureSettings)
+    settle_delay: Optional[float] = None  # Falls back to the profile's settle delay
+
+@dataclass
+class Shot:
+    step: int
+    ring: int
+    angle: float
+    settings: CaptureSettings
+    settle_delay: float
+
+@dataclass
+class ScanProfile:
+    name: str
+    rings: List[Ring]
+    settle_delay: float = 0.5
+    processing_level: int = 1
+    mask: bool = False  # Crop photos to the object using the rig's background reference
+    # Seconds a capture round trip may take; framesize and quality are lowered per camera to fit
+    transfer_target: Optional[float] = None
+
+    def shots(self) -> List[Shot]:
+        # Steps are numbered from 1 across all rings, like the controller's rotation_complete
+        shots = []
+        for ring_index, ring in enumerate(self.rings):
+            settle = ring.settle_delay if ring.settle_delay is not None else self.settle_delay
+            for angle in ring.angles:
+                shots.append(Shot(len(shots) + 1, ring_index, angle, ring.settings, settle))
+        return shots
+
+    @property
+    def total_steps(self) -> int:
+        return sum(len(ring.angles) for ring in self.rings)
+
+def commanded_angle(angle: float) -> int:
+    # The controller's /motor only takes whole degrees
+    return int(round(angle)) % 360
+
+def uniform_angles(count: int, start: float = 0) -> List[float]:
+    if count < 1:
+        raise ValueError("Angle count must be at least 1")
+    return [round((start + i * 360 / count) % 360, 2) for i in range(count)]
+
+def dense_near_features(count: int, features: List[float], dense_count: int = 8, width: float = 30) -> List[float]:
+    # A uniform base pass plus extra shots packed within +/- width/2 around each feature angle
+    angles = set(uniform_angles(count))
+    for feature in features:
+        for i in range(dense_count):
+            offset = -width / 2 + width * i / max(1, dense_count - 1)
+            angles.add(round((feature + offset) % 360, 2))
+    return sorted(angles)
+
+def build_angles(spec: Dict) -> List[float]:
+    schedule = spec.get("schedule", "uniform")
+    if schedule == "uniform":
+        return uniform_angles(int(spec.get("count", 60)), float(spec.get("start", 0)))
+    if schedule == "dense":
+        return dense_near_features(
+            int(spec.get("count", 24)),
+            [float(angle) for angle in spec.get("features", [])],
+            int(spec.get("dense_count", 8)),
+            float(spec.get("width", 30))
+        )
+    if schedule == "explicit":
+        return [float(angle) % 360 for angle in spec["angles"]]
+    raise ValueError(f"Unknown angle schedule: {schedule}")
+
+def profile_from_dict(name: str, data: Dict) -> ScanProfile:
+    # A profile either lists "rings" or is itself a single ring
+    ring_specs = data.get("rings", [data])
+    rings = []
+    for spec in ring_specs:
+        if not isinstance(spec, dict):
+            raise ValueError("Each ring must be an object")
+        settings = CaptureSettings(framesize=spec.get("framesize"),
+                                   exposure=int(spec["exposure"]) if spec.get("exposure") is not None else None,
+                                   quality=int(spec["quality"]) if spec.get("quality") is not None else None)
+        if settings.framesize is not None and settings.framesize not in FRAMESIZES:
+            raise ValueError(f"Unknown framesize: {settings.framesize}")
+        if settings.exposure is not None and not 0 <= settings.exposure <= 1200:
+            raise ValueError("Exposure must be between 0 and 1200")
+        if settings.quality is not None and not 0 <= settings.quality <= 63:
+            raise ValueError("JPEG quality must be between 0 and 63")
+        rings.append(Ring(build_angles(spec), settings, spec.get("settle_delay")))
+
+    if not rings:
+        raise ValueError("Profile needs at least one ring")
+
+    processing_level = int(data.get("processing_level", 1))
+    if processing_level not in PROCESSING_LEVELS:
+        raise ValueError(f"Processing level must be one of {PROCESSING_LEVELS}")
+
+    transfer_target = data.get("transfer_target")
+    if transfer_target is not None and float(transfer_target) <= 0:
+        raise ValueError("Transfer target must be positive")
+
+    return ScanProfile(
+        name=name,
+        rings=rings,
+        settle_delay=float(data.get("settle_delay", 0.5)),
+        processing_level=processing_level,
+        mask=bool(data.get("mask", False)),
+        transfer_target=float(transfer_target) if transfer_target is not None else None
+    )
+
+def profile_from_state(data: Dict) -> ScanProfile:
+    # Inverse of asdict(profile), used to pick up a journaled scan after a restart
+    rings = [
+        Ring(list(ring["angles"]), CaptureSettings(**ring.get("settings", {})), ring.get("settle_delay"))
+        for ring in data["rings"]
+    ]
+    return ScanProfile(
+        name=data["name"],
+        rings=rings,
+        settle_delay=data.get("settle_delay", 0.5),
+        processing_level=data.get("processing_level", 1),
+        mask=data.get("mask", False),
+        transfer_target=data.get("transfer_target")
+    )
+
+FIRMWARE_STEPS = 60  # The controller's own rotation: 60 steps of 6 degrees
+FIRMWARE_SETTLE = 0.5  # Seconds the controller already waits after each move before reporting it
+
+def firmware_profile() -> ScanProfile:
+    # What the controller does on /start_rotation: step N is taken at (N - 1) * 6 degrees
+    return ScanProfile(name="firmware", rings=[Ring(uniform_angles(FIRMWARE_STEPS))])
+
+BUILTIN_PROFILES = {
+    # Quick low-resolution pass for checking placement and lighting, reconstructed at half scale
+    "preview": {"schedule": "uniform", "count": 24, "framesize": "VGA", "settle_delay": 0.3, "processing_level": 2},
+    # Same coverage the controller firmware drives on its own: 60 steps of 6 degrees
+    "full": {"schedule": "uniform", "count": 60, "framesize": "SVGA", "settle_delay": 0.5},
+    # Two passes offset by half a step with a higher resolution second pass
+    "multi-ring": {
+        "settle_delay": 0.5,
+        "rings": [
+            {"schedule": "uniform", "count": 36, "framesize": "SVGA"},
+            {"schedule": "uniform", "count": 36, "start": 5, "framesize": "XGA"}
+        ]
+    }
+}
+
+def load_profiles(path: Optional[str] = None) -> Dict[str, ScanProfile]:
+    specs = dict(BUILTIN_PROFILES)
+    if path and os.path.exists(path):
+        with open(path, 'r') as f:
+            specs.update(json.load(f))
+    return {name: profile_from_dict(name, spec) for name, spec in specs.items()}
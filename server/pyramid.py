@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+from storage import file_digest
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+LEVELS = (2, 4, 8)
+
+def build_pyramid(source: str, cache_folder: str, level_folders: Dict[int, str]) -> str:
+    # Runs in a worker process. Levels are cached by content hash, so re-processing
+    # the same photo (or an identical one from another scan) only costs a hardlink.
+    digest = file_digest(source)
+    for level, folder in level_folders.items():
+        cached = os.path.join(cache_folder, f"{digest}_{level}.jpg")
+        if not os.path.exists(cached):
+            with Image.open(source) as image:
+                size = (max(1, image.width // level), max(1, image.height // level))
+                # JPEG can decode straight to 1/2, 1/4 or 1/8 scale, skipping the full-size decode
+                image.draft('RGB', size)
+                scaled = image.convert('RGB')
+                if scaled.size != size:
+                    scaled = scaled.resize(size, Image.BILINEAR)
+                partial = f"{cached}.{os.getpid()}.tmp"
+                scaled.save(partial, 'JPEG', quality=90)
+                os.replace(partial, cached)
+
+        os.makedirs(folder, exist_ok=True)
+        target = os.path.join(folder, os.path.basename(source))
+        if os.path.exists(target):
+            os.remove(target)
+        try:
+            os.link(cached, target)
+        except OSError:
+            shutil.copyfile(cached, target)
+    return digest
+
+class PyramidBuilder:
+    def __init__(self, cache_folder: str, workers: int = 2):
+        self.cache_folder = cache_folder
+        self.worker_count = max(1, workers)
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+
+    def is_available(self) -> bool:
+        return Image is not None
+
+    def submit(self, source: str, level_folders: Dict[int, str]) -> Optional[Future]:
+        if not self.is_available():
+            return None
+
+        with self.lock:
+            # The pool is started on first use so idle app instances don't start workers
+            if self.pool is None:
+                os.makedirs(self.cache_folder, exist_ok=True)
+                # Spawned rather than forked: forking a process full of server threads can deadlock
+                self.pool = ProcessPoolExecutor(max_workers=self.worker_count,
+                                                mp_context=multiprocessing.get_context('spawn'))
+            return self.pool.submit(build_pyramid, source, self.cache_folder, level_folders)
+
+    def wait(self, futures: List[Future]) -> None:
+        wait(futures)
+        for future in futures:
+            # Surface the first failure to the caller
+            future.result()
+
+    def shutdown(self) -> None:
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
@@ -0,0 +1,102 @@
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+from journal import ScanJournal
+from models import hash_token
+
+# Bodies up to this size are kept verbatim; larger ones (photos) only by size
+MAX_BODY = 4096
+# Values the server hands out that later requests refer to, remapped on replay
+ISSUED_KEYS = ("token", "upload_id")
+# Traces get carried around, so board tokens are only ever written as their hash
+SECRET_KEYS = ("token",)
+
+class TrafficRecorder:
+    def __init__(self, path: str):
+        self.path = path
+        self.log = ScanJournal(path, sync_interval=1.0)
+        self.origin = time.perf_counter()
+        self.log.append("recording", version=2)
+        print(f"Recording board traffic to {path}")
+
+    def offset(self, moment: Optional[float] = None) -> float:
+        return round((moment if moment is not None else time.perf_counter()) - self.origin, 6)
+
+    def record_boards(self, rigs: List) -> None:
+        # Boards restored from the registry never call /api/register during the recording, so
+        # replay registers them from these entries and maps their tokens by hash
+        for rig in rigs:
+            for board in (rig.board_manager.camera_board, rig.board_manager.controller_board):
+                if board:
+                    self.log.append("board", rig=rig.rig_id, type=board.board_type, ip=board.ip_address,
+                                    token_hash=board.token_hash or hash_token(board.token))
+
+    def record_inbound(self, request, response, started: float) -> None:
+        token = request.headers.get('Authorization', '').replace('Bearer ', '')
+        entry = {
+            "at": self.offset(started),
+            "method": request.method,
+            "path": request.path,
+            "query": request.query_string.decode(),
+            "token_hash": hash_token(token) if token else None,
+            "content_type": request.mimetype or None,
+            "size": request.content_length or 0,
+            "status": response.status_code,
+            "latency": round(time.perf_counter() - started, 6)
+        }
+        if request.headers.get('Upload-Offset') is not None:
+            entry["upload_offset"] = request.headers['Upload-Offset']
+
+        if request.is_json and entry["size"] <= MAX_BODY:
+            entry["json"] = request.get_json(silent=True)
+        elif request.mimetype == 'multipart/form-data':
+            entry["form"] = request.form.to_dict()
+            entry["files"] = {name: file.filename for name, file in request.files.items()}
+
+        if response.is_json and not response.is_streamed:
+            data = response.get_json(silent=True)
+            if isinstance(data, dict):
+                issued = {key: hash_token(data[key]) if key in SECRET_KEYS else data[key]
+                          for key in ISSUED_KEYS if key in data}
+                if issued:
+                    entry["issued"] = issued
+
+        self.log.append("in", **entry)
+
+    def record_outbound(self, url: str, kwargs: Dict, started: float, response=None,
+                        error: Optional[Exception] = None) -> None:
+        parts = urlsplit(url)
+        entry = {
+            "at": self.offset(started),
+            "board": parts.netloc,
+            "path": parts.path,
+            "json": kwargs.get("json"),
+            "latency": round(time.perf_counter() - started, 6)
+        }
+        if response is not None:
+            entry["status"] = response.status_code
+            entry["size"] = len(response.content or b"")
+            entry["content_type"] = response.headers.get('Content-Type')
+        else:
+            entry["error"] = type(error).__name__
+        self.log.append("out", **entry)
+
+class RecordingHttp:
+    # Wraps the boards' HTTP client and logs every call with its latency and response size
+    def __init__(self, http, recorder: TrafficRecorder):
+        self.http = http
+        self.recorder = recorder
+
+    def __getattr__(self, name: str):
+        # Everything but post (e.g. get_adapter for connection prewarming) goes to the wrapped client
+        return getattr(self.http, name)
+
+    def post(self, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.post(url, **kwargs)
+        except Exception as e:
+            self.recorder.record_outbound(url, kwargs, started, error=e)
+            raise
+        self.recorder.record_outbound(url, kwargs, started, response)
+        return response
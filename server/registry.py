@@ -0,0 +1,92 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from models import Board
+
+class BoardRegistry:
+    def __init__(self, path: str, flush_interval: float = 5.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # Heartbeat updates per (rig, board type), written together instead of one commit each
+        self.pending: Dict[Tuple[str, str], Tuple[float, str]] = {}
+        self.flusher: Optional[threading.Thread] = None
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS boards ("
+            " rig_id TEXT NOT NULL,"
+            " board_type TEXT NOT NULL,"
+            " ip_address TEXT NOT NULL,"
+            " token_hash TEXT NOT NULL,"
+            " registered REAL NOT NULL,"
+            " last_seen REAL NOT NULL,"
+            " telemetry TEXT NOT NULL DEFAULT '{}',"
+            " PRIMARY KEY (rig_id, board_type))"
+        )
+        self.db.commit()
+
+    def load(self) -> List[Dict]:
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT rig_id, board_type, ip_address, token_hash, last_seen, telemetry FROM boards"
+            ).fetchall()
+        return [
+            {
+                "rig_id": rig_id,
+                "board_type": board_type,
+                "ip_address": ip_address,
+                "token_hash": token_hash,
+                "last_seen": last_seen,
+                "telemetry": json.loads(telemetry)
+            }
+            for rig_id, board_type, ip_address, token_hash, last_seen, telemetry in rows
+        ]
+
+    def save(self, rig_id: str, board: Board) -> None:
+        # Registrations are rare and hand out a new token, so they are written straight away
+        with self.lock:
+            self.pending.pop((rig_id, board.board_type), None)
+            self.db.execute(
+                "INSERT OR REPLACE INTO boards VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (rig_id, board.board_type, board.ip_address, board.token_hash,
+                 time.time(), board.last_seen, json.dumps(board.telemetry))
+            )
+            self.db.commit()
+
+    def remove(self, rig_id: str, board_type: str) -> None:
+        with self.lock:
+            self.pending.pop((rig_id, board_type), None)
+            self.db.execute("DELETE FROM boards WHERE rig_id = ? AND board_type = ?", (rig_id, board_type))
+            self.db.commit()
+
+    def touch(self, rig_id: str, board: Board) -> None:
+        with self.lock:
+            self.pending[(rig_id, board.board_type)] = (board.last_seen, json.dumps(board.telemetry))
+            if self.flusher is None:
+                self.flusher = threading.Thread(target=self._flush_loop, daemon=True)
+                self.flusher.start()
+
+    def flush(self) -> None:
+        with self.lock:
+            if not self.pending:
+                return
+            updates = [(last_seen, telemetry, rig_id, board_type)
+                       for (rig_id, board_type), (last_seen, telemetry) in self.pending.items()]
+            self.pending = {}
+            self.db.executemany(
+                "UPDATE boards SET last_seen = ?, telemetry = ? WHERE rig_id = ? AND board_type = ?",
+                updates
+            )
+            self.db.commit()
+
+    def _flush_loop(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                print(f"Failed to write board registry: {e}")
@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+import requests
+from flask import Flask, Response
+from werkzeug.serving import make_server
+from imaging import Image
+from journal import ScanJournal
+
+DEFAULT_URL = os.environ.get("PHOTOGRAMMETRY_URL", "http://localhost:8888/api").rstrip("/")
+# Scan ids, job ids and upload ids are folded so requests group per endpoint
+ID_SEGMENT = re.compile(r'/(\d{8}_\d{6}_[0-9a-f]{4}|[0-9a-f]{12,})(?=/|$)')
+
+def load_trace(path: str) -> tuple[List[Dict], List[Dict], List[Dict]]:
+    events = ScanJournal(path).replay()
+    inbound = sorted((event for event in events if event.get("event") == "in"), key=lambda event: event["at"])
+    outbound = sorted((event for event in events if event.get("event") == "out"), key=lambda event: event["at"])
+    boards = [event for event in events if event.get("event") == "board"]
+    return inbound, outbound, boards
+
+def sample_body(size: int, content_type: Optional[str]) -> bytes:
+    # Only sizes are recorded; photos are replaced by a real JPEG padded to the same length
+    body = b""
+    if content_type and "jpeg" in content_type:
+        if Image is not None:
+            output = io.BytesIO()
+            Image.new('L', (64, 48), 128).save(output, 'JPEG')
+            body = output.getvalue()
+        else:
+            body = b"\xff\xd8\xff\xd9"
+    return body + b"\0" * max(0, size - len(body))
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def endpoint_key(method: str, path: str) -> str:
+    return f"{method} {ID_SEGMENT.sub('/<id>', path)}"
+
+class BoardSimulator:
+    def __init__(self, outbound: List[Dict], speed: float):
+        self.speed = speed
+        self.lock = threading.Lock()
+        self.responses: Dict[str, Dict[str, deque]] = {}
+        for entry in outbound:
+            self.responses.setdefault(entry["board"], {}).setdefault(entry["path"], deque()).append(entry)
+        self.addresses: Dict[str, str] = {}
+        self.servers = []
+
+    def start(self, registered: List[str]) -> None:
+        # One local HTTP server per recorded board answers the server under test
+        for board in sorted(set(self.responses) | set(registered)):
+            server = make_server('127.0.0.1', 0, self.board_app(board), threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            self.servers.append(server)
+            self.addresses[board] = f"127.0.0.1:{server.server_port}"
+            print(f"Simulating board {board} on {self.addresses[board]}")
+
+    def stop(self) -> None:
+        for server in self.servers:
+            server.shutdown()
+
+    def address(self, board: str) -> str:
+        return self.addresses.get(board, board)
+
+    def board_app(self, board: str) -> Flask:
+        app = Flask(f"board_{board}")
+
+        @app.route('/<path:path>', methods=['POST'])
+        def respond(path):
+            entry = self.next_response(board, f"/{path}")
+            if entry is None:
+                return Response(status=404)
+            time.sleep(entry["latency"] / self.speed if self.speed else 0)
+            if "error" in entry:
+                return Response(status=504)
+            body = sample_body(entry.get("size", 0), entry.get("content_type"))
+            return Response(body, status=entry.get("status", 200), content_type=entry.get("content_type"))
+
+        return app
+
+    def next_response(self, board: str, path: str) -> Optional[Dict]:
+        # Recorded responses are served in order; the last one repeats if the new build asks more often
+        with self.lock:
+            queue = self.responses.get(board, {}).get(path)
+            if not queue:
+                return None
+            return queue.popleft() if len(queue) > 1 else queue[0]
+
+class Replayer:
+    def __init__(self, base_url: str, speed: float, boards: BoardSimulator):
+        # Recorded paths carry the /api prefix themselves
+        self.server_url = base_url[:-len("/api")] if base_url.endswith("/api") else base_url
+        self.speed = speed
+        self.boards = boards
+        self.local = threading.local()
+        self.issued: Dict[str, str] = {}
+        self.condition = threading.Condition()
+        self.results: List[Dict] = []
+
+    def register_boards(self, boards: List[Dict]) -> None:
+        # Boards the recorded server already knew only show up by their token hash; register them
+        # with the server under test and send the new tokens wherever that hash was recorded
+        for board in boards:
+            response = requests.post(f"{self.server_url}/api/register", timeout=10, json={
+                "type": board["type"], "ip": self.boards.address(board["ip"]), "rig": board["rig"]
+            })
+            if response.status_code != 200:
+                print(f"Registering recorded {board['type']} board {board['ip']} failed: {response.status_code}",
+                      file=sys.stderr)
+                continue
+            self.issued[board["token_hash"]] = response.json()["token"]
+
+    def run(self, inbound: List[Dict]) -> Dict[str, Any]:
+        # Each board (and the user, without a token) sends in recorded order, like the real clients;
+        # different boards overlap as they did on the rig
+        lanes: Dict[Optional[str], ThreadPoolExecutor] = {}
+        started = time.perf_counter()
+        for entry in inbound:
+            delay = started + (entry["at"] / self.speed if self.speed else 0) - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            lane = lanes.setdefault(entry.get("token_hash"), ThreadPoolExecutor(max_workers=1))
+            lane.submit(self.send, entry)
+        for lane in lanes.values():
+            lane.shutdown()
+        return self.report(time.perf_counter() - started)
+
+    def remap(self, value: Optional[str], timeout: float = 10) -> Optional[str]:
+        # Later requests use tokens (recorded by hash) and upload ids from earlier responses, which
+        # differ on every run
+        if value is None:
+            return None
+        with self.condition:
+            self.condition.wait_for(lambda: value in self.issued, timeout)
+            return self.issued.get(value, value)
+
+    def send(self, entry: Dict) -> None:
+        path = entry["path"]
+        match = re.search(r'/api/uploads/([0-9a-f]{16})', path)
+        if match:
+            path = path.replace(match.group(1), self.remap(match.group(1)))
+        url = f"{self.server_url}{path}" + (f"?{entry['query']}" if entry.get("query") else "")
+
+        headers = {}
+        token = self.remap(entry.get("token_hash"))
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        if "upload_offset" in entry:
+            headers["Upload-Offset"] = entry["upload_offset"]
+
+        kwargs: Dict[str, Any] = {"headers": headers}
+        if "json" in entry:
+            data = entry["json"]
+            if isinstance(data, dict) and path.endswith("/register") and "ip" in data:
+                data = dict(data, ip=self.boards.address(data["ip"]))
+            kwargs["json"] = data
+        elif "files" in entry:
+            size = max(0, entry["size"] - 512)
+            kwargs["files"] = {name: (filename or "photo.jpg", sample_body(size, "image/jpeg"), "image/jpeg")
+                               for name, filename in entry["files"].items()}
+            kwargs["data"] = entry.get("form") or {}
+        elif entry.get("size"):
+            headers["Content-Type"] = entry.get("content_type") or "application/octet-stream"
+            kwargs["data"] = sample_body(entry["size"], entry.get("content_type"))
+
+        sent = time.perf_counter()
+        try:
+            if not hasattr(self.local, "session"):
+                self.local.session = requests.Session()
+            response = self.local.session.request(entry["method"], url, timeout=60, **kwargs)
+            status = response.status_code
+        except requests.RequestException as e:
+            response = None
+            status = None
+            print(f"{entry['method']} {path} failed: {e}", file=sys.stderr)
+        latency = time.perf_counter() - sent
+
+        if response is not None and entry.get("issued"):
+            try:
+                data = response.json()
+            except ValueError:
+                data = {}
+            with self.condition:
+                for key, value in entry["issued"].items():
+                    if key in data:
+                        self.issued[value] = data[key]
+                self.condition.notify_all()
+
+        with self.condition:
+            self.results.append({
+                "endpoint": endpoint_key(entry["method"], entry["path"]),
+                "status": status,
+                "recorded_status": entry.get("status"),
+                "latency": latency,
+                "recorded_latency": entry.get("latency")
+            })
+
+    def report(self, duration: float) -> Dict[str, Any]:
+        endpoints: Dict[str, Dict[str, Any]] = {}
+        for result in self.results:
+            stats = endpoints.setdefault(result["endpoint"], {"latencies": [], "recorded": [], "mismatches": 0})
+            stats["latencies"].append(result["latency"])
+            if result["recorded_latency"] is not None:
+                stats["recorded"].append(result["recorded_latency"])
+            if result["status"] != result["recorded_status"]:
+                stats["mismatches"] += 1
+
+        summary = {}
+        for key, stats in sorted(endpoints.items()):
+            summary[key] = {
+                "count": len(stats["latencies"]),
+                "p50": percentile(stats["latencies"], 0.5),
+                "p95": percentile(stats["latencies"], 0.95),
+                "max": max(stats["latencies"]),
+                "recorded_p50": percentile(stats["recorded"], 0.5),
+                "status_mismatches": stats["mismatches"]
+            }
+
+        return {
+            "url": self.server_url,
+            "speed": self.speed,
+            "requests": len(self.results),
+            "duration": duration,
+            "throughput": len(self.results) / duration if duration else None,
+            "status_mismatches": sum(stats["status_mismatches"] for stats in summary.values()),
+            "endpoints": summary
+        }
+
+def change(before: Optional[float], after: Optional[float]) -> str:
+    if not before or after is None:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+def ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.1f}" if value is not None else "-"
+
+def compare_reports(before: Dict, after: Dict) -> str:
+    lines = [
+        f"Throughput: {before['throughput']:.2f} -> {after['throughput']:.2f} req/s "
+        f"({change(before['throughput'], after['throughput'])})",
+        f"Status mismatches: {before['status_mismatches']} -> {after['status_mismatches']}",
+        "",
+        f"{'endpoint':<40} {'p50 ms':>18} {'change':>8} {'p95 ms':>18} {'change':>8}"
+    ]
+    for key in sorted(set(before["endpoints"]) | set(after["endpoints"])):
+        a = before["endpoints"].get(key, {})
+        b = after["endpoints"].get(key, {})
+        lines.append(
+            f"{key:<40} {ms(a.get('p50')) + ' -> ' + ms(b.get('p50')):>18} {change(a.get('p50'), b.get('p50')):>8} "
+            f"{ms(a.get('p95')) + ' -> ' + ms(b.get('p95')):>18} {change(a.get('p95'), b.get('p95')):>8}"
+        )
+    return "\n".join(lines)
+
+def cmd_run(args) -> int:
+    inbound, outbound, recorded_boards = load_trace(args.trace)
+    if not inbound:
+        print(f"No recorded requests in {args.trace}", file=sys.stderr)
+        return 1
+
+    boards = BoardSimulator(outbound, args.speed)
+    boards.start([entry["json"]["ip"] for entry in inbound
+                  if entry["path"].endswith("/register") and isinstance(entry.get("json"), dict) and "ip" in entry["json"]]
+                 + [board["ip"] for board in recorded_boards])
+    try:
+        replayer = Replayer(args.url, args.speed, boards)
+        replayer.register_boards(recorded_boards)
+        report = replayer.run(inbound)
+    finally:
+        boards.stop()
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"Replayed {report['requests']} requests in {report['duration']:.1f}s "
+          f"({report['throughput']:.2f} req/s, {report['status_mismatches']} status mismatches)")
+    for key, stats in report["endpoints"].items():
+        print(f"  {key:<40} n={stats['count']:<5} p50 {ms(stats['p50'])} ms (recorded {ms(stats['recorded_p50'])} ms)"
+              f"  p95 {ms(stats['p95'])} ms")
+    return 0
+
+def cmd_compare(args) -> int:
+    with open(args.before, 'r') as f:
+        before = json.load(f)
+    with open(args.after, 'r') as f:
+        after = json.load(f)
+    print(compare_reports(before, after))
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay recorded board traffic against a server and compare builds.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Replay a recording against a running server")
+    run.add_argument("trace", help="Recording written with PHOTOGRAMMETRY_RECORD")
+    run.add_argument("--url", default=DEFAULT_URL, help="Server API URL (env PHOTOGRAMMETRY_URL)")
+    run.add_argument("--speed", type=float, default=1.0, help="Time scale, e.g. 10 for 10x; 0 sends as fast as possible")
+    run.add_argument("--report", help="Write the latency and throughput report to this JSON file")
+    run.set_defaults(handler=cmd_run)
+
+    compare = commands.add_parser("compare", help="Diff two replay reports")
+    compare.add_argument("before")
+    compare.add_argument("after")
+    compare.set_defaults(handler=cmd_compare)
+
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    if getattr(args, "speed", 1) < 0:
+        print("Speed can't be negative", file=sys.stderr)
+        return 2
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
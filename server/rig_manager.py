@@ -0,0 +1,135 @@
+import glob
+import os
+import threading
+import requests
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+from board_manager import BoardManager
+from scan_manager import ScanManager
+from config import RIG_ID_PATTERN, Config
+from processing import ProcessingScheduler
+from pyramid import PyramidBuilder
+from registry import BoardRegistry
+from storage import PhotoStorage
+
+@dataclass
+class Rig:
+    rig_id: str
+    board_manager: BoardManager
+    scan_manager: ScanManager
+
+    def get_status(self) -> Dict[str, str]:
+        status = self.board_manager.get_status()
+        status["scan_status"] = self.scan_manager.get_status()
+        return status
+
+class RigManager:
+    def __init__(self, config: Config, http=None, scheduler: Optional[ProcessingScheduler] = None,
+                 storage_factory: Callable[[str], PhotoStorage] = PhotoStorage,
+                 pyramid: Optional[PyramidBuilder] = None, registry: Optional[BoardRegistry] = None):
+        self.config = config
+        # One HTTP client (and its connection pool) is shared by the boards of every rig
+        self.http = http if http is not None else requests.Session()
+        self.scheduler = scheduler
+        self.pyramid = pyramid
+        self.registry = registry
+        self.storage_factory = storage_factory
+        self.rigs: Dict[str, Rig] = {}
+        self.lock = threading.Lock()
+
+    def get(self, rig_id: str) -> Optional[Rig]:
+        return self.rigs.get(rig_id)
+
+    def get_or_create(self, rig_id: str) -> Rig:
+        with self.lock:
+            rig = self.rigs.get(rig_id)
+            if rig:
+                return rig
+
+            rig_config = self.config.for_rig(rig_id)
+            board_manager = BoardManager(
+                http=self.http,
+                http_timeout=rig_config.http_timeout,
+                board_timeout=rig_config.board_timeout
+            )
+            scan_manager = ScanManager(
+                board_manager,
+                self.storage_factory(rig_config.upload_folder),
+                rig_config,
+                rig_id=rig_id,
+                scheduler=self.scheduler,
+                pyramid=self.pyramid
+            )
+            rig = Rig(rig_id=rig_id, board_manager=board_manager, scan_manager=scan_manager)
+            self.rigs[rig_id] = rig
+            print(f"Rig {rig_id} created")
+            return rig
+
+    def restore(self) -> List[Rig]:
+        # Bring back every rig that has a journal so interrupted scans show up before its boards re-register
+        prefix = f"{self.config.journal_file}_"
+        for path in sorted(glob.glob(f"{glob.escape(prefix)}*")):
+            rig_id = os.path.basename(path)[len(os.path.basename(prefix)):]
+            if RIG_ID_PATTERN.match(rig_id):
+                self.get_or_create(rig_id)
+
+        # Known boards are accepted again on their next heartbeat instead of having to re-register
+        if self.registry:
+            for entry in self.registry.load():
+                if not RIG_ID_PATTERN.match(entry["rig_id"]):
+                    continue
+                rig = self.get_or_create(entry["rig_id"])
+                rig.board_manager.restore_board(
+                    entry["board_type"], entry["ip_address"], entry["token_hash"],
+                    entry["last_seen"], entry["telemetry"]
+                )
+                print(f"Restored {entry['board_type']} board at {entry['ip_address']} for rig {entry['rig_id']}")
+
+            rigs = self.all()
+            threading.Thread(
+                target=lambda: [rig.board_manager.prewarm() for rig in rigs],
+                daemon=True
+            ).start()
+        return self.all()
+
+    def all(self) -> List[Rig]:
+        return list(self.rigs.values())
+
+    def register_board(self, rig_id: str, board_type: str, ip_address: str):
+        rig = self.get_or_create(rig_id)
+        board = rig.board_manager.register_board(board_type, ip_address)
+
+        # A board moved to another rig must stop answering for its old one
+        for other in self.all():
+            if other is rig:
+                continue
+            if board_type == "camera" and other.board_manager.camera_board and \
+                    other.board_manager.camera_board.ip_address == ip_address:
+                other.board_manager.camera_board = None
+            elif board_type == "controller" and other.board_manager.controller_board and \
+                    other.board_manager.controller_board.ip_address == ip_address:
+                other.board_manager.controller_board = None
+            else:
+                continue
+            if self.registry:
+                self.registry.remove(other.rig_id, board_type)
+
+        if self.registry:
+            self.registry.save(rig.rig_id, board)
+        return rig, board
+
+    def find_by_token(self, token: str) -> Optional[Rig]:
+        if not token:
+            return None
+        for rig in self.all():
+            if rig.board_manager.get_board_by_token(token):
+                return rig
+        return None
+
+    def update_heartbeat(self, token: str, telemetry: Optional[Dict] = None) -> bool:
+        rig = self.find_by_token(token)
+        if not rig or not rig.board_manager.update_heartbeat(token, telemetry):
+            return False
+        if self.registry:
+            self.registry.touch(rig.rig_id, rig.board_manager.get_board_by_token(token))
+        return True
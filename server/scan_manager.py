@@ -1,20 +1,157 @@
 import os
+import copy
 import datetime
-from typing import Optional
-import requests
+import functools
+import secrets
+import shutil
+import threading
+import time
+from dataclasses import asdict
+from typing import Dict, List, Optional
+from bandwidth import TransferEstimator
 from board_manager import BoardManager
+from config import Config
+from idempotency import IdempotencyCache
+from imaging import sharpness
+from journal import ScanJournal
+from masking import build_masked_input, is_available as masking_available
+from models import Job, ScanSession
+from poses import refine_angles, write_priors
+from processing import ProcessingScheduler
+from profiles import (FIRMWARE_SETTLE, FIRMWARE_STEPS, CaptureSettings, ScanProfile, commanded_angle, firmware_profile,
+                      profile_from_state)
+from pyramid import LEVELS, PyramidBuilder
+from settle import SettleTimes, angle_distance, step_bucket
+from storage import PhotoStorage, file_digest
 
 class ScanManager:
-    def __init__(self, board_manager: BoardManager):
+    def __init__(self, board_manager: BoardManager, storage: PhotoStorage, config: Optional[Config] = None,
+                 rig_id: str = "default", scheduler: Optional[ProcessingScheduler] = None,
+                 pyramid: Optional[PyramidBuilder] = None):
         self.board_manager = board_manager
-        self.UPLOAD_FOLDER = './uploads'
-        self.PHOTOGRAMMETRY_OUTPUT = './output'
-        self.SCAN_STATUS_FILE = '.scan_status'
-        
+        self.storage = storage
+        self.config = config or Config()
+        self.rig_id = rig_id
+        self.scheduler = scheduler
+        self.pyramid = pyramid
+        self.pyramid_futures: Dict[str, List] = {}
+        self.pyramid_failed: set = set()  # Scans missing some scaled copies
+        self.lock = threading.Lock()
+        self.session: Optional[ScanSession] = None
+        self.sessions: List[ScanSession] = []
+        self.abort_event = threading.Event()
+        self.settle_times = SettleTimes(self.config.settle_file)
+        self.calibration: Optional[Dict] = None
+        self.journal = ScanJournal(self.config.journal_file)
+        self.tracer = board_manager.tracer
+        # Per scan: the profile it runs (for resuming) and the photo saved for each step
+        self.scan_profiles: Dict[str, Optional[Dict]] = {}
+        self.step_files: Dict[str, Dict[int, str]] = {}
+        # Capture round trip estimates per camera, keyed by its token (a reboot registers anew)
+        self.transfers: Dict[str, TransferEstimator] = {}
+        # Controllers retry rotation_complete when their request times out; each step is captured once
+        self.step_outcomes = IdempotencyCache(self.config.step_idempotency_ttl)
+        self.UPLOAD_FOLDER = storage.root
+        self.PHOTOGRAMMETRY_OUTPUT = self.config.output_folder
+        self.SCAN_STATUS_FILE = self.config.scan_status_file
+
         # Ensure folders exist
-        os.makedirs(self.UPLOAD_FOLDER, exist_ok=True)
         os.makedirs(self.PHOTOGRAMMETRY_OUTPUT, exist_ok=True)
 
+        self.recover()
+
+    def recover(self) -> None:
+        owner = self.journal.claim()
+        sessions: Dict[str, ScanSession] = {}
+        expected: Dict[str, Dict[int, Dict]] = {}
+        for event in self.journal.replay():
+            scan_id = event.get("scan_id")
+            kind = event.get("event")
+            if kind == "scan_start":
+                sessions[scan_id] = ScanSession(
+                    scan_id=scan_id,
+                    rig_id=self.rig_id,
+                    folder=event["folder"],
+                    started=event["time"],
+                    profile=event.get("profile"),
+                    total_steps=event.get("total_steps"),
+                    processing_level=event.get("processing_level", 1),
+                    mask=event.get("mask", False)
+                )
+                self.scan_profiles[scan_id] = event.get("profile_state")
+                self.step_files[scan_id] = {}
+                expected[scan_id] = {}
+                continue
+
+            session = sessions.get(scan_id)
+            if not session:
+                continue
+            if kind == "step":
+                self.step_files[scan_id][event["step"]] = event["file"]
+                expected[scan_id][event["step"]] = event
+            elif kind == "step_failed":
+                if event["step"] not in session.failed_steps:
+                    session.failed_steps.append(event["step"])
+            elif kind == "scan_resume":
+                session.status = "scanning"
+                session.total_steps = event.get("total_steps", session.total_steps)
+                session.finished = None
+            elif kind == "scan_end":
+                session.status = event["status"]
+                session.finished = event["time"]
+            elif kind == "job":
+                session.job_id = event["job_id"]
+
+        if not owner:
+            # Another server process is running these scans; list them but leave them alone
+            print(f"Journal {self.journal.path} is in use by another process, not recovering its scans")
+
+        for scan_id, session in sessions.items():
+            interrupted = owner and session.status == "scanning"
+            # A step only counts if its photo survived the crash intact. Resume relies on the steps
+            # of interrupted scans, so those photos are also checked against their hash
+            files = self.step_files[scan_id]
+            for step, path in list(files.items()):
+                if not self.photo_intact(path, expected[scan_id][step], interrupted):
+                    print(f"Photo for step {step} of scan {scan_id} is missing or damaged")
+                    del files[step]
+            session.completed_steps = sorted(files)
+            session.failed_steps = [step for step in session.failed_steps if step not in files]
+            if interrupted:
+                self.quarantine_strays(session)
+                session.status = "interrupted"
+                print(f"Scan {scan_id} on rig {self.rig_id} was interrupted after "
+                      f"{len(session.completed_steps)} photos and can be resumed")
+
+        self.sessions = list(sessions.values())
+        # The status file may still say "scanning" from the previous process
+        if owner and self.get_status() != "idle":
+            self.set_status("idle")
+
+    def quarantine_strays(self, session: ScanSession) -> None:
+        # Jobs read the whole scan folder, so photos the journal doesn't vouch for (saved but never
+        # journaled, or failing verification) are moved aside along with their scaled copies
+        if not os.path.isdir(session.folder):
+            return
+        kept = {os.path.basename(path) for path in self.step_files[session.scan_id].values()}
+        strays = [name for name in os.listdir(session.folder)
+                  if name not in kept and os.path.isfile(os.path.join(session.folder, name))]
+        for name in strays:
+            os.makedirs(self.quarantine_folder(session.scan_id), exist_ok=True)
+            os.replace(os.path.join(session.folder, name), os.path.join(self.quarantine_folder(session.scan_id), name))
+            for level in LEVELS:
+                scaled = os.path.join(self.pyramid_folder(session.scan_id, level), name)
+                if os.path.exists(scaled):
+                    os.remove(scaled)
+        if strays:
+            print(f"Moved {len(strays)} unverified files of scan {session.scan_id} to "
+                  f"{self.quarantine_folder(session.scan_id)}")
+
+    def photo_intact(self, path: str, event: Dict, check_hash: bool) -> bool:
+        if not os.path.exists(path) or os.path.getsize(path) != event.get("size", os.path.getsize(path)):
+            return False
+        return not check_hash or "sha256" not in event or file_digest(path) == event["sha256"]
+
     def get_status(self) -> str:
         if not os.path.exists(self.SCAN_STATUS_FILE):
             return "idle"
@@ -25,34 +162,307 @@ class ScanManager:
         with open(self.SCAN_STATUS_FILE, 'w') as f:
             f.write(status)
 
-    def start_scan(self) -> tuple[bool, Optional[str]]:
-        if self.get_status() == "scanning":
-            return False, "Scan already in progress"
+    def get_progress(self) -> Optional[Dict]:
+        session = self.session or (self.sessions[-1] if self.sessions else None)
+        return asdict(session) if session else None
+
+    def check_ready(self) -> Optional[str]:
+        status = self.get_status()
+        if status == "scanning":
+            return "Scan already in progress"
+        if status == "calibrating":
+            return "Calibration in progress"
 
         if not self.board_manager.camera_board or not self.board_manager.controller_board:
-            return False, "Not all boards connected"
+            return "Not all boards connected"
 
-        if not (self.board_manager.camera_board.is_alive() and 
+        if not (self.board_manager.camera_board.is_alive() and
                 self.board_manager.controller_board.is_alive()):
-            return False, "One or more boards not responding"
+            return "One or more boards not responding"
+
+        return None
+
+    def start_scan(self, profile: Optional[ScanProfile] = None) -> tuple[bool, Optional[str]]:
+        with self.tracer.span("start_scan"):
+            with self.lock:
+                error = self.check_ready()
+                if error:
+                    return False, error
+
+                self.set_status("scanning")
+                session = self.open_session(profile)
 
-        self.set_status("scanning")
-        self.board_manager.update_lcd("Scan Starting", "Please wait...")
-        
-        # Start the scanning process
+            if session.mask:
+                self.snapshot_background(session)
+            self.board_manager.update_lcd("Scan Starting", "Please wait...")
+
+            if profile is not None:
+                # The server drives the rotation through /motor, one shot at a time
+                worker = threading.Thread(
+                    target=self.run_profile,
+                    args=(session, profile, self.abort_event),
+                    daemon=True
+                )
+                worker.start()
+                return True, None
+
+            # Start the scanning process
+            try:
+                response = self.board_manager.post(self.board_manager.controller_board, "/start_rotation")
+                if response.status_code != 200:
+                    self.close_session("failed")
+                    self.board_manager.update_lcd("Start Failed")
+                    return False, "Failed to start controller"
+            except Exception as e:
+                self.close_session("failed")
+                self.board_manager.update_lcd("Start Failed")
+                return False, f"Controller error: {str(e)}"
+
+            return True, None
+
+    def open_session(self, profile: Optional[ScanProfile]) -> ScanSession:
+        scan_id = f"{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}_{secrets.token_hex(2)}"
+        session = ScanSession(
+            scan_id=scan_id,
+            rig_id=self.rig_id,
+            folder=self.storage.folder(scan_id),
+            started=time.time(),
+            profile=profile.name if profile else None,
+            total_steps=profile.total_steps if profile else None,
+            processing_level=profile.processing_level if profile else 1,
+            mask=profile.mask if profile else False
+        )
+        # Every scan gets a fresh abort flag so a stale worker can't pick up the next scan's
+        self.abort_event = threading.Event()
+        self.session = session
+        self.sessions.append(session)
+        self.scan_profiles[scan_id] = asdict(profile) if profile else None
+        self.step_files[scan_id] = {}
+        self.tracer.start(scan_id)
+        self.journal.append(
+            "scan_start",
+            sync=True,
+            scan_id=scan_id,
+            folder=session.folder,
+            profile=session.profile,
+            profile_state=self.scan_profiles[scan_id],
+            total_steps=session.total_steps,
+            processing_level=session.processing_level,
+            mask=session.mask
+        )
+        print(f"Scan {scan_id} started on rig {self.rig_id} ({session.profile or 'firmware'})")
+        return session
+
+    def close_session(self, status: str) -> Optional[ScanSession]:
+        with self.lock:
+            session = self.session
+            if session:
+                session.status = status
+                session.finished = time.time()
+                self.journal.append("scan_end", sync=True, scan_id=session.scan_id, status=status)
+                self.tracer.stop(self.trace_path(session.scan_id))
+            self.session = None
+            self.set_status("idle")
+        return session
+
+    def resume_scan(self, scan_id: Optional[str] = None) -> tuple[bool, Optional[str]]:
+        with self.lock:
+            error = self.check_ready()
+            if error:
+                return False, error
+
+            resumable = [session for session in self.sessions
+                         if session.status in ("interrupted", "failed", "aborted")
+                         and (scan_id is None or session.scan_id == scan_id)]
+            if not resumable:
+                return False, "No interrupted scan to resume"
+            session = resumable[-1]
+
+            # Firmware-driven scans are picked up by driving the firmware's own schedule from here
+            state = self.scan_profiles.get(session.scan_id)
+            profile = profile_from_state(state) if state else firmware_profile()
+
+            self.set_status("scanning")
+            self.abort_event = threading.Event()
+            session.status = "scanning"
+            session.finished = None
+            session.total_steps = profile.total_steps
+            session.failed_steps = []
+            self.session = session
+            self.tracer.start(session.scan_id)
+            self.journal.append("scan_resume", sync=True, scan_id=session.scan_id, total_steps=session.total_steps)
+
+        done = set(session.completed_steps)
+        print(f"Resuming scan {session.scan_id} with {profile.total_steps - len(done)} of {profile.total_steps} steps left")
+        # Downscaled copies from before the restart may be incomplete; the cache makes this cheap
+        for path in self.step_files.get(session.scan_id, {}).values():
+            self.queue_pyramid(path, session)
+
+        self.board_manager.update_lcd("Scan Resuming", f"{len(done)}/{profile.total_steps} done")
+        worker = threading.Thread(
+            target=self.run_profile,
+            args=(session, profile, self.abort_event, done),
+            daemon=True
+        )
+        worker.start()
+        return True, None
+
+    def run_profile(self, session: ScanSession, profile: ScanProfile, abort_event: threading.Event,
+                    skip_steps: Optional[set] = None) -> None:
+        previous_angle = None
+        negotiated: Dict[int, CaptureSettings] = {}
+        for shot in profile.shots():
+            if abort_event.is_set():
+                return
+            if skip_steps and shot.step in skip_steps:
+                continue
+
+            with self.tracer.span("shot", step=shot.step, angle=shot.angle):
+                with self.tracer.span("move"):
+                    success, error = self.move_to(shot.angle)
+                if not success:
+                    print(f"Scan {session.scan_id} stopped at step {shot.step}: {error}")
+                    self.board_manager.update_lcd("Error", "Motor Failed")
+                    self.close_session("failed")
+                    return
+
+                # Give the turntable and object time to stop swaying; wakes early on abort
+                delay = self.settle_delay(previous_angle, shot.angle, shot.settle_delay)
+                with self.tracer.span("settle", delay=delay):
+                    if abort_event.wait(delay):
+                        return
+                previous_angle = shot.angle
+
+                settings = shot.settings
+                transfer = self.transfer_estimator()
+                if profile.transfer_target and transfer:
+                    settings = transfer.choose(shot.settings, profile.transfer_target, negotiated.get(shot.ring))
+                    negotiated[shot.ring] = settings
+                success, error = self.capture_photo(shot.step, settings, session)
+                if abort_event.is_set():
+                    return
+                if not success:
+                    print(f"Scan {session.scan_id} step {shot.step} failed: {error}")
+                    self.board_manager.update_lcd("Error", "Capture Failed")
+
+        if not abort_event.is_set():
+            self.handle_scan_complete()
+
+    def settle_delay(self, previous_angle: Optional[float], angle: float, default: float) -> float:
+        # Calibrated settle times win over the profile's fixed delay once this rig has them
+        if previous_angle is None:
+            return default
+        calibrated = self.settle_times.get(angle_distance(round(previous_angle), round(angle)))
+        return calibrated if calibrated is not None else default
+
+    def start_calibration(self, step_sizes: List[float], delays: List[float], trials: int = 2,
+                          threshold: float = 0.9, reference_delay: float = 2.0) -> tuple[bool, Optional[str]]:
+        with self.lock:
+            error = self.check_ready()
+            if error:
+                return False, error
+
+            self.set_status("calibrating")
+            self.abort_event = threading.Event()
+            self.calibration = {"status": "running", "step_size": None, "delay": None, "results": {}}
+
+        self.board_manager.update_lcd("Calibrating", "Settle times")
+        worker = threading.Thread(
+            target=self.run_calibration,
+            args=(sorted(step_sizes), sorted(delays), trials, threshold, reference_delay, self.abort_event),
+            daemon=True
+        )
+        worker.start()
+        return True, None
+
+    def run_calibration(self, step_sizes: List[float], delays: List[float], trials: int,
+                        threshold: float, reference_delay: float, abort_event: threading.Event) -> None:
+        angle = 0
         try:
-            response = requests.post(
-                f"http://{self.board_manager.controller_board.ip_address}/start_rotation",
-                headers={"Authorization": f"Bearer {self.board_manager.controller_board.token}"},
-                timeout=5
+            success, error = self.move_to(angle)
+            if not success:
+                raise IOError(error)
+
+            for step_size in step_sizes:
+                self.update_calibration(step_size=step_size)
+                chosen = reference_delay
+                for delay in delays:
+                    self.update_calibration(delay=delay)
+                    worst = None
+                    for _ in range(trials):
+                        angle = (angle + step_size) % 360
+                        score = self.measure_settle(angle, delay, reference_delay, abort_event)
+                        if score is None:
+                            self.update_calibration(status="aborted")
+                            return
+                        worst = score if worst is None else min(worst, score)
+
+                    print(f"Settle calibration: {step_size} deg after {delay}s scores {worst:.2f}")
+                    if worst >= threshold:
+                        chosen = delay
+                        break
+
+                self.settle_times.set(step_size, chosen)
+                with self.lock:
+                    self.calibration["results"][str(step_bucket(step_size))] = chosen
+
+            self.update_calibration(status="done")
+            self.board_manager.update_lcd("Calibration", "Complete")
+        except Exception as e:
+            print(f"Settle calibration failed: {str(e)}")
+            self.update_calibration(status="failed", error=str(e))
+            self.board_manager.update_lcd("Calibration", "Failed")
+        finally:
+            if not abort_event.is_set():
+                self.set_status("idle")
+
+    def update_calibration(self, **fields) -> None:
+        with self.lock:
+            self.calibration.update(fields)
+
+    def get_calibration(self) -> Optional[Dict]:
+        # The calibration worker keeps writing to it, so callers get a snapshot
+        with self.lock:
+            return copy.deepcopy(self.calibration)
+
+    def measure_settle(self, angle: float, delay: float, reference_delay: float,
+                       abort_event: threading.Event) -> Optional[float]:
+        # Sharpness right after the move relative to a settled shot of the same view
+        started = time.time()
+        success, error = self.move_to(angle)
+        if not success:
+            raise IOError(error)
+
+        if abort_event.wait(delay):
+            return None
+        moving, error = self.fetch_photo(0)
+        if moving is None:
+            raise IOError(error)
+
+        if abort_event.wait(max(0, reference_delay - (time.time() - started))):
+            return None
+        settled, error = self.fetch_photo(0)
+        if settled is None:
+            raise IOError(error)
+
+        reference = sharpness(settled)
+        return sharpness(moving) / reference if reference > 0 else 1.0
+
+    def move_to(self, angle: float) -> tuple[bool, Optional[str]]:
+        controller = self.board_manager.controller_board
+        if not controller:
+            return False, "Controller not connected"
+
+        try:
+            response = self.board_manager.post(
+                controller,
+                "/motor",
+                json={"angle": commanded_angle(angle), "relative": False},
+                timeout=self.config.motor_timeout
             )
             if response.status_code != 200:
-                self.set_status("idle")
-                self.board_manager.update_lcd("Start Failed")
-                return False, "Failed to start controller"
+                return False, "Failed to control motor"
         except Exception as e:
-            self.set_status("idle")
-            self.board_manager.update_lcd("Start Failed")
             return False, f"Controller error: {str(e)}"
 
         return True, None
@@ -60,76 +470,345 @@ class ScanManager:
     def handle_capture_complete(self, step: int) -> None:
         self.board_manager.update_lcd("Scanning...", f"Photo {step} OK")
 
-    def handle_rotation_complete(self, step: int) -> tuple[bool, Optional[str]]:
+    def fetch_photo(self, step: int, settings: Optional[CaptureSettings] = None) -> tuple[Optional[bytes], Optional[str]]:
+        camera = self.board_manager.camera_board
+        if not camera:
+            return None, "Camera not connected"
+
+        payload = {"step": step}
+        if settings:
+            payload.update(settings.to_request())
+
+        transfer = self.transfer_estimator()
         try:
-            response = requests.post(
-                f"http://{self.board_manager.camera_board.ip_address}/capture",
-                json={"step": step},
-                headers={"Authorization": f"Bearer {self.board_manager.camera_board.token}"},
-                timeout=5
-            )
+            started = time.perf_counter()
+            response = self.board_manager.post(camera, "/capture", json=payload)
+            if transfer:
+                transfer.sent(payload)
             if response.status_code != 200:
-                self.board_manager.update_lcd("Error", "Capture Failed")
-                return False, "Failed to trigger capture"
+                return None, "Failed to trigger capture"
+            if transfer:
+                transfer.observe(len(response.content), time.perf_counter() - started)
+
+            # Log response details
+            print(f"Response content length: {len(response.content)}")
+            print(f"Response content type: {response.headers.get('Content-Type')}")
+
+            photo_data = response.content
+            if len(photo_data) == 0:
+                print("Error: Received empty photo data")
+                return None, "Received empty photo data"
         except Exception as e:
+            return None, f"Camera error: {str(e)}"
+
+        return photo_data, None
+
+    def transfer_estimator(self) -> Optional[TransferEstimator]:
+        camera = self.board_manager.camera_board
+        if not camera or not camera.token:
+            return None
+        with self.lock:
+            return self.transfers.setdefault(camera.token, TransferEstimator())
+
+    def get_transfer_status(self) -> Optional[Dict]:
+        transfer = self.transfer_estimator()
+        return transfer.get_status() if transfer else None
+
+    def capture_photo(self, step: int, settings: Optional[CaptureSettings] = None,
+                      session: Optional[ScanSession] = None) -> tuple[bool, Optional[str]]:
+        # session is the scan the photo is taken for (None for single shots). If it has ended by the
+        # time the photo arrives, the photo is dropped rather than filed under whatever runs now
+        with self.tracer.span("capture", step=step, **(settings.to_request() if settings else {})):
+            photo_data, error = self.fetch_photo(step, settings)
+            if photo_data is None:
+                self.record_step(step, False, error=error, session=session)
+                return False, error
+            if session is not self.session:
+                return False, "Scan ended before the photo arrived"
+
+            # Save the photo data
+            try:
+                path = self.save_photo(f"photo_{step}.jpg", photo_data, session)
+            except Exception as e:
+                self.record_step(step, False, error=str(e), session=session)
+                return False, f"Camera error: {str(e)}"
+
+            if not self.record_step(step, True, path, session=session):
+                os.remove(path)
+                return False, "Scan ended before the photo arrived"
+            return True, None
+
+    def record_step(self, step: int, success: bool, path: Optional[str] = None, error: Optional[str] = None,
+                    session: Optional[ScanSession] = None) -> bool:
+        # Returns False if the scan the step belongs to is no longer the one running
+        with self.tracer.span("record_step", step=step), self.lock:
+            if session is not self.session:
+                return False
+            if not session:
+                return True
+            if success:
+                if step not in session.completed_steps:
+                    session.completed_steps.append(step)
+                if step in session.failed_steps:
+                    session.failed_steps.remove(step)
+                self.step_files.setdefault(session.scan_id, {})[step] = path
+                self.journal.append("step", scan_id=session.scan_id, step=step, file=path,
+                                    size=os.path.getsize(path), sha256=file_digest(path))
+            else:
+                if step not in session.failed_steps:
+                    session.failed_steps.append(step)
+                self.journal.append("step_failed", scan_id=session.scan_id, step=step, error=error)
+            return True
+
+    def handle_rotation_complete(self, step: int) -> tuple[bool, Optional[str]]:
+        with self.tracer.span("handle_rotation_complete", step=step) as tags:
+            session = self.session
+            controller = self.board_manager.controller_board
+            if not session or not controller:
+                return self.capture_step(step)
+
+            key = (session.scan_id, controller.ip_address, step)
+            result, duplicate = self.step_outcomes.run(key, lambda: self.capture_step(step, session),
+                                                       succeeded=lambda result: result[0])
+            if duplicate:
+                tags["duplicate"] = True
+                print(f"Step {step} of scan {session.scan_id} was already handled, reusing its result")
+            return result or (False, "Capture failed")
+
+    def capture_step(self, step: int, session: Optional[ScanSession] = None) -> tuple[bool, Optional[str]]:
+        # Give the object the calibrated time to stop swaying, as run_profile does between shots,
+        # minus the pause the controller already took between the end of its move and reporting it
+        calibrated = self.settle_times.get(360 / FIRMWARE_STEPS)
+        delay = max(0, calibrated - FIRMWARE_SETTLE) if calibrated else 0
+        if delay:
+            with self.tracer.span("settle", delay=delay):
+                if self.abort_event.wait(delay):
+                    return False, "Scan aborted"
+        success, error = self.capture_photo(step, session=session)
+        if not success:
             self.board_manager.update_lcd("Error", "Capture Failed")
-            return False, f"Camera error: {str(e)}"
+        return success, error
 
-        return True, None
+    def handle_scan_complete(self) -> Optional[Job]:
+        with self.tracer.span("handle_scan_complete"):
+            session = self.close_session("complete")
+            self.board_manager.update_lcd("Scan Complete", "Processing...")
+
+            input_folder = session.folder if session else self.UPLOAD_FOLDER
+            output_folder = os.path.join(self.PHOTOGRAMMETRY_OUTPUT, session.scan_id) if session else self.PHOTOGRAMMETRY_OUTPUT
+
+            # Inputs are finished on the processing worker before the tool runs
+            prepare = None
+            priors_folder = None
+            if session:
+                futures = self.pyramid_futures.pop(session.scan_id, [])
+                complete = session.scan_id not in self.pyramid_failed
+                self.pyramid_failed.discard(session.scan_id)
+                if session.processing_level > 1 and not (futures and complete):
+                    print(f"No scaled copies for scan {session.scan_id}, processing at full size")
+                    futures = []
+                priors_folder = self.priors_folder(session.scan_id)
+                prepare = functools.partial(self.prepare_input, session, futures, priors_folder)
+
+            if self.scheduler is None:
+                # Without a shared scheduler, process inline like a single-rig setup
+                if prepare:
+                    input_folder = prepare()
+                print("Starting photogrammetry processing...")
+                os.system(self.config.photogrammetry_command.format(
+                    input=input_folder, output=output_folder, priors=priors_folder or ""))
+                self.board_manager.update_lcd("Scan Complete", "Process Done")
+                return None
+
+            os.makedirs(output_folder, exist_ok=True)
+            job = self.scheduler.submit(
+                self.rig_id,
+                input_folder,
+                output_folder,
+                on_done=self.handle_processing_done,
+                prepare=prepare,
+                priors_folder=priors_folder
+            )
+            if session:
+                session.job_id = job.job_id
+                self.journal.append("job", scan_id=session.scan_id, job_id=job.job_id)
+            return job
+
+    def prepare_input(self, session: ScanSession, futures: List, priors_folder: str) -> str:
+        # Returns the folder the job reads: the downscaled copies once the last ones are written,
+        # or the full-size photos if any of them failed, then masked if the scan asked for it
+        input_folder = session.folder
+        if futures:
+            try:
+                self.pyramid.wait(futures)
+                input_folder = self.pyramid_folder(session.scan_id, session.processing_level)
+            except Exception as e:
+                print(f"Scaled copies for scan {session.scan_id} failed ({e}), processing at full size")
+
+        if session.mask:
+            # Masks are built from whichever photos the job would have used
+            masked_folder = os.path.join(self.mask_folder(session.scan_id), 'photos')
+            self.build_masks(session, input_folder, masked_folder)
+            input_folder = masked_folder
 
-    def handle_scan_complete(self) -> None:
-        self.set_status("idle")
-        self.board_manager.update_lcd("Scan Complete", "Processing...")
-        
-        # Start photogrammetry processing
-        print("Starting photogrammetry processing...")
-        os.system(f"photogrammetry-tool --input {self.UPLOAD_FOLDER} --output {self.PHOTOGRAMMETRY_OUTPUT}")
-        
-        self.board_manager.update_lcd("Scan Complete", "Process Done")
+        self.build_priors(session, priors_folder, input_folder)
+        return input_folder
+
+    def handle_processing_done(self, job: Job) -> None:
+        if job.status == "done":
+            self.board_manager.update_lcd("Scan Complete", "Process Done")
+        else:
+            self.board_manager.update_lcd("Scan Complete", "Process Failed")
 
     def abort_scan(self) -> tuple[bool, list[str]]:
-        if self.get_status() != "scanning":
+        if self.get_status() not in ("scanning", "calibrating"):
             return False, ["No scan in progress"]
 
+        self.abort_event.set()
         result = self.board_manager.send_abort()
-        self.set_status("idle")
+        self.close_session("aborted")
         self.board_manager.update_lcd("Scan Aborted", "System Ready")
 
         return True, result.get("errors", [])
 
-    def save_photo(self, filename: str, file_data) -> None:
+    def photo_filename(self, step) -> str:
+        # Create timestamped filename; the client supplied name is never used as-is
+        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        return f"photo_{step}_{timestamp}.jpg"
+
+    def photo_subfolder(self, session: Optional[ScanSession]) -> Optional[str]:
+        # Photos taken during a scan go into that scan's folder, single shots into the rig root
+        return session.scan_id if session else None
+
+    def background_path(self) -> str:
+        return os.path.join(self.storage.root, 'background.jpg')
+
+    def quarantine_folder(self, scan_id: str) -> str:
+        return os.path.join(self.storage.root, '.quarantine', scan_id)
+
+    def mask_folder(self, scan_id: str) -> str:
+        return os.path.join(self.storage.root, '.masked', scan_id)
+
+    def capture_background(self, settings: Optional[CaptureSettings] = None) -> tuple[bool, Optional[str]]:
+        # Taken with the turntable empty; scans with masking compare every photo against it
+        photo_data, error = self.fetch_photo(0, settings)
+        if photo_data is None:
+            return False, error
+        partial = f"{self.background_path()}.tmp"
+        os.makedirs(self.storage.root, exist_ok=True)
+        with open(partial, 'wb') as f:
+            f.write(photo_data)
+        os.replace(partial, self.background_path())
+        return True, None
+
+    def snapshot_background(self, session: ScanSession) -> None:
+        # Each scan keeps the reference it started with, even if a new one is taken later
+        if not masking_available():
+            print(f"Masking for scan {session.scan_id} needs NumPy and Pillow, skipping")
+            session.mask = False
+        elif not os.path.exists(self.background_path()):
+            print(f"No background reference for rig {self.rig_id}, scan {session.scan_id} won't be masked")
+            session.mask = False
+        else:
+            os.makedirs(self.mask_folder(session.scan_id), exist_ok=True)
+            shutil.copyfile(self.background_path(), os.path.join(self.mask_folder(session.scan_id), 'background.jpg'))
+
+    def build_masks(self, session: ScanSession, source_folder: str, target_folder: str) -> None:
+        build_masked_input(
+            source_folder,
+            os.path.join(self.mask_folder(session.scan_id), 'background.jpg'),
+            target_folder,
+            session.scan_id
+        )
+
+    def priors_folder(self, scan_id: str) -> str:
+        return os.path.join(self.storage.root, '.priors', scan_id)
+
+    def build_priors(self, session: ScanSession, folder: str, input_folder: Optional[str] = None) -> None:
+        # Each photo starts from the angle the turntable was sent to, then gets refined from the images
+        state = self.scan_profiles.get(session.scan_id)
+        profile = profile_from_state(state) if state else firmware_profile()
+        angles = {shot.step: commanded_angle(shot.angle) for shot in profile.shots()}
+        files = self.step_files.get(session.scan_id, {})
+        photos = [
+            {"step": step, "angle": angles[step], "path": files[step]}
+            for step in sorted(files) if step in angles and os.path.exists(files[step])
+        ]
+        refine_angles(photos, self.config.turntable_ellipse)
+        write_priors(photos, folder, session.scan_id, input_folder)
+        refined = [photo for photo in photos if photo["refined_angle"] != photo["angle"]]
+        print(f"Wrote pose priors for {len(photos)} photos of scan {session.scan_id} ({len(refined)} refined)")
+
+    def trace_path(self, scan_id: str) -> str:
+        return os.path.join(self.PHOTOGRAMMETRY_OUTPUT, 'traces', f"{scan_id}.json")
+
+    def pyramid_folder(self, scan_id: str, level: int) -> str:
+        return os.path.join(self.storage.root, '.pyramid', scan_id, f"level_{level}")
+
+    def queue_pyramid(self, path: str, session: Optional[ScanSession]) -> None:
+        # Only the scale the scan will be reconstructed from is built
+        if not session or not self.pyramid or session.processing_level not in LEVELS:
+            return
         try:
-            # Extract step number if present in filename (e.g., "photo_5.jpg" -> "5")
-            step = "0"
-            if "_" in filename and "." in filename:
-                step = filename.split("_")[1].split(".")[0]
-            
-            # Create timestamped filename
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            new_filename = f"photo_{step}_{timestamp}.jpg"
-            
-            save_path = os.path.join(self.UPLOAD_FOLDER, new_filename)
-            print(f"Saving photo to: {os.path.abspath(save_path)}")
-            
-            # Ensure upload directory exists
-            os.makedirs(self.UPLOAD_FOLDER, exist_ok=True)
-            
-            # Handle both file object and raw data
-            if hasattr(file_data, 'save'):
-                print(f"Saving file object to {save_path}")
-                file_data.save(save_path)
-            else:
-                print(f"Writing {len(file_data)} bytes of raw data to {save_path}")
-                with open(save_path, 'wb') as f:
-                    f.write(file_data)
-            
-            # Verify file was saved
-            if os.path.exists(save_path):
-                size = os.path.getsize(save_path)
-                print(f"Successfully saved {new_filename} ({size} bytes)")
-            else:
-                raise IOError(f"File {save_path} was not created")
-                
+            future = self.pyramid.submit(
+                path, {session.processing_level: self.pyramid_folder(session.scan_id, session.processing_level)})
         except Exception as e:
-            print(f"Error saving photo: {str(e)}")
-            raise
+            # The photo itself is saved; the job just has to fall back to full size
+            print(f"Could not queue a scaled copy of {path}: {e}")
+            self.pyramid_failed.add(session.scan_id)
+            return
+        if future:
+            self.pyramid_futures.setdefault(session.scan_id, []).append(future)
+
+    def save_photo(self, filename: str, file_data, session: Optional[ScanSession] = None) -> str:
+        with self.tracer.span("save_photo", bytes=len(file_data) if isinstance(file_data, bytes) else None):
+            try:
+                # Extract step number if present in filename (e.g., "photo_5.jpg" -> "5")
+                step = "0"
+                if "_" in filename and "." in filename:
+                    step = filename.split("_")[1].split(".")[0]
+
+                path = self.storage.save(self.photo_filename(step), file_data, self.photo_subfolder(session))
+            except Exception as e:
+                print(f"Error saving photo: {str(e)}")
+                raise
+
+            self.queue_pyramid(path, session)
+            return path
+
+    def begin_upload(self, step: int, size: Optional[int] = None) -> Dict:
+        self.storage.purge_uploads(self.config.upload_expiry)
+        upload_id = secrets.token_hex(8)
+        meta = {"upload_id": upload_id, "step": step, "size": size}
+        self.storage.begin_upload(upload_id, meta)
+        meta["offset"] = 0
+        return meta
+
+    def get_upload(self, upload_id: str) -> Optional[Dict]:
+        try:
+            return self.storage.upload_meta(upload_id)
+        except ValueError:
+            return None
+
+    def write_upload(self, upload_id: str, offset: int, stream, size: Optional[int] = None) -> int:
+        return self.storage.write_chunk(upload_id, offset, stream, size)
+
+    def commit_upload(self, upload_id: str, sha256: Optional[str] = None) -> tuple[Optional[str], Optional[str]]:
+        session = self.session
+        meta = self.get_upload(upload_id)
+        if not meta:
+            return None, "Unknown upload"
+        if meta.get("size") is not None and meta["offset"] != meta["size"]:
+            return None, f"Upload incomplete: {meta['offset']} of {meta['size']} bytes"
+
+        try:
+            path = self.storage.commit_upload(
+                upload_id, self.photo_filename(meta["step"]), self.photo_subfolder(session), sha256)
+        except ValueError as e:
+            return None, str(e)
+
+        if not self.record_step(meta["step"], True, path, session=session):
+            os.remove(path)
+            return None, "Scan ended before the upload was committed"
+        self.queue_pyramid(path, session)
+        return path, None
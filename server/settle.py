@@ -0,0 +1,51 @@
+import json
+import os
+import threading
+from typing import Dict, Optional
+
+class SettleTimes:
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # Calibrated settle seconds keyed by step size in whole degrees
+        self.times: Dict[int, float] = {}
+        self.load()
+
+    def load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                self.times = {int(step): float(delay) for step, delay in json.load(f).items()}
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable settle times {self.path}: {e}")
+
+    def save(self) -> None:
+        with self.lock:
+            data = {str(step): delay for step, delay in sorted(self.times.items())}
+            with open(self.path, 'w') as f:
+                json.dump(data, f, indent=2)
+
+    def set(self, step_size: float, delay: float) -> None:
+        with self.lock:
+            self.times[step_bucket(step_size)] = delay
+        self.save()
+
+    def get(self, step_size: float) -> Optional[float]:
+        # A larger move never settles faster, so use the closest calibrated size at or above this one
+        step = step_bucket(step_size)
+        candidates = [size for size in self.times if size >= step]
+        if not candidates:
+            return None
+        return self.times[min(candidates)]
+
+    def as_dict(self) -> Dict[str, float]:
+        return {str(step): delay for step, delay in sorted(self.times.items())}
+
+def step_bucket(step_size: float) -> int:
+    return max(1, int(round(abs(step_size))))
+
+def angle_distance(a: float, b: float) -> float:
+    # Shortest way round, which is also how the controller moves
+    diff = abs(a - b) % 360
+    return min(diff, 360 - diff)
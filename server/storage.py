@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import BinaryIO, Dict, Optional
+
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{16}$')
+CHUNK_SIZE = 64 * 1024
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class UploadTooLarge(ValueError):
+    pass
+
+class PhotoStorage:
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+        # One writer per upload: a resumed request racing the original would both pass the offset check
+        self.upload_locks: Dict[str, threading.Lock] = {}
+        self.upload_locks_guard = threading.Lock()
+
+    def folder(self, subfolder: Optional[str] = None) -> str:
+        if not subfolder:
+            return self.root
+        return os.path.join(self.root, os.path.basename(subfolder))
+
+    def path(self, filename: str, subfolder: Optional[str] = None) -> str:
+        # Never trust client supplied names to stay inside the storage root
+        return os.path.join(self.folder(subfolder), os.path.basename(filename))
+
+    def save(self, filename: str, file_data, subfolder: Optional[str] = None) -> str:
+        save_path = self.path(filename, subfolder)
+        print(f"Saving photo to: {os.path.abspath(save_path)}")
+
+        # Ensure storage directory exists
+        os.makedirs(self.folder(subfolder), exist_ok=True)
+
+        # Written to a temporary file and synced before it takes the real name, so a crash never
+        # leaves a truncated photo behind that the journal counts as saved
+        partial = f"{save_path}.tmp"
+        with open(partial, 'wb') as f:
+            # Handle both file object and raw data
+            if hasattr(file_data, 'save'):
+                print(f"Saving file object to {save_path}")
+                file_data.save(f)
+            else:
+                print(f"Writing {len(file_data)} bytes of raw data to {save_path}")
+                f.write(file_data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(partial, save_path)
+
+        # Verify file was saved
+        if not os.path.exists(save_path):
+            raise IOError(f"File {save_path} was not created")
+
+        print(f"Successfully saved {os.path.basename(save_path)} ({os.path.getsize(save_path)} bytes)")
+        return save_path
+
+    # Resumable uploads are appended to a part file; its size on disk is the committed offset
+
+    def partial_path(self, upload_id: str) -> str:
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise ValueError(f"Invalid upload id: {upload_id}")
+        return os.path.join(self.root, '.partial', f"{upload_id}.part")
+
+    def begin_upload(self, upload_id: str, meta: Dict) -> None:
+        part_path = self.partial_path(upload_id)
+        os.makedirs(os.path.dirname(part_path), exist_ok=True)
+        open(part_path, 'wb').close()
+        with open(f"{part_path}.json", 'w') as f:
+            json.dump(meta, f)
+
+    def upload_meta(self, upload_id: str) -> Optional[Dict]:
+        part_path = self.partial_path(upload_id)
+        if not os.path.exists(part_path):
+            return None
+        with open(f"{part_path}.json", 'r') as f:
+            meta = json.load(f)
+        meta["offset"] = os.path.getsize(part_path)
+        return meta
+
+    def upload_lock(self, upload_id: str) -> threading.Lock:
+        with self.upload_locks_guard:
+            return self.upload_locks.setdefault(upload_id, threading.Lock())
+
+    def write_chunk(self, upload_id: str, offset: int, stream: BinaryIO, size: Optional[int] = None) -> int:
+        # Bytes go straight from the request stream into the part file. Whatever arrived
+        # before a dropped connection stays on disk, so the client resumes from there.
+        # A body that runs past the declared size is dropped whole, whether or not it had a length
+        part_path = self.partial_path(upload_id)
+        lock = self.upload_lock(upload_id)
+        if not lock.acquire(blocking=False):
+            raise ValueError("Upload is being written by another request")
+        try:
+            with open(part_path, 'ab') as f:
+                if f.tell() != offset:
+                    raise ValueError(f"Offset mismatch, upload is at {f.tell()}")
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if size is not None and f.tell() + len(chunk) > size:
+                        # Cut back to where this body started, or the part file would read as complete
+                        f.truncate(offset)
+                        raise UploadTooLarge("Chunk exceeds declared size")
+                    f.write(chunk)
+        finally:
+            lock.release()
+        return os.path.getsize(part_path)
+
+    def purge_uploads(self, max_age: float) -> None:
+        # Part files nobody has written to for max_age seconds were abandoned by their camera
+        folder = os.path.join(self.root, '.partial')
+        if not os.path.isdir(folder):
+            return
+        cutoff = time.time() - max_age
+        for name in os.listdir(folder):
+            part_path = os.path.join(folder, name)
+            upload_id = name[:-len('.part')]
+            if not name.endswith('.part') or os.path.getmtime(part_path) >= cutoff:
+                continue
+            lock = self.upload_lock(upload_id)
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                os.remove(part_path)
+                if os.path.exists(f"{part_path}.json"):
+                    os.remove(f"{part_path}.json")
+                with self.upload_locks_guard:
+                    self.upload_locks.pop(upload_id, None)
+            finally:
+                lock.release()
+            print(f"Removed abandoned upload {upload_id}")
+
+    def commit_upload(self, upload_id: str, filename: str, subfolder: Optional[str] = None,
+                      sha256: Optional[str] = None) -> str:
+        part_path = self.partial_path(upload_id)
+        if sha256 and file_digest(part_path) != sha256.lower():
+            raise ValueError("Checksum mismatch")
+
+        save_path = self.path(filename, subfolder)
+        os.makedirs(self.folder(subfolder), exist_ok=True)
+        with open(part_path, 'rb') as f:
+            os.fsync(f.fileno())
+        # A rename, not a copy: the part file already lives on the same filesystem
+        os.replace(part_path, save_path)
+        os.remove(f"{part_path}.json")
+        with self.upload_locks_guard:
+            self.upload_locks.pop(upload_id, None)
+        print(f"Successfully saved {os.path.basename(save_path)} ({os.path.getsize(save_path)} bytes)")
+        return save_path
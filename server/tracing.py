@@ -0,0 +1,168 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+class ScanTracer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.scan_id: Optional[str] = None
+        self.origin = 0.0
+        self.started = 0.0
+        self.events: List[Dict] = []
+        self.threads: Dict[int, str] = {}
+        self.pending: Optional[tuple[int, str]] = None
+
+    def start(self, scan_id: str) -> None:
+        with self.lock:
+            pending, self.pending = self.pending, None
+        if pending:
+            self.write(pending[1])
+
+        with self.lock:
+            self.scan_id = scan_id
+            self.origin = time.perf_counter()
+            self.started = time.time()
+            self.events = []
+            self.threads = {}
+
+    def stop(self, path: str) -> None:
+        # Spans still open on this thread (e.g. the handler that ended the scan) belong in the
+        # trace too, so the file is written once the outermost one closes
+        if self.stack():
+            with self.lock:
+                self.pending = (threading.get_ident(), path)
+            return
+        self.write(path)
+
+    def stack(self) -> List[Dict]:
+        if not hasattr(self.local, "stack"):
+            self.local.stack = []
+        return self.local.stack
+
+    @contextmanager
+    def span(self, name: str, category: str = "scan", **args) -> Iterator[Dict]:
+        stack = self.stack()
+        # Nested spans inherit their parent's tags, so an HTTP call knows its step
+        tags = dict(stack[-1]) if stack else {}
+        tags.update(args)
+        stack.append(tags)
+        start = time.perf_counter()
+        try:
+            yield tags
+        finally:
+            end = time.perf_counter()
+            stack.pop()
+            self.record(name, category, start, end, tags)
+            if not stack and self.pending and self.pending[0] == threading.get_ident():
+                self.write(self.pending[1])
+
+    def record(self, name: str, category: str, start: float, end: float, tags: Dict) -> None:
+        with self.lock:
+            if self.scan_id is None:
+                return
+            thread = threading.current_thread()
+            self.threads[thread.ident] = thread.name
+            self.events.append({
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": round((start - self.origin) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "pid": os.getpid(),
+                "tid": thread.ident,
+                "args": {"scan_id": self.scan_id, **tags}
+            })
+
+    def write(self, path: str) -> None:
+        with self.lock:
+            if self.scan_id is None:
+                return
+            events = [
+                {"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": tid, "args": {"name": name}}
+                for tid, name in self.threads.items()
+            ] + self.events
+            trace = {
+                "traceEvents": events,
+                "displayTimeUnit": "ms",
+                "otherData": {"scan_id": self.scan_id, "started": self.started}
+            }
+            self.scan_id = None
+            self.pending = None
+            self.events = []
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        partial = f"{path}.tmp"
+        with open(partial, 'w') as f:
+            json.dump(trace, f)
+        os.replace(partial, path)
+        print(f"Wrote scan trace {path} ({len(events)} events)")
+
+class RequestProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.enabled = False
+        self.started: Optional[float] = None
+        self.requests = 0
+        self.skipped = 0
+        self.stats: Optional[pstats.Stats] = None
+        # Only one profiler can be active per process (Python 3.12+ refuses a second one), so
+        # requests overlapping a profiled one run unprofiled and are counted instead
+        self.active = threading.Lock()
+
+    def set_enabled(self, enabled: bool) -> None:
+        with self.lock:
+            if enabled and not self.enabled:
+                # A fresh run discards the stats of the previous one
+                self.started = time.time()
+                self.requests = 0
+                self.skipped = 0
+                self.stats = None
+            self.enabled = enabled
+
+    def begin(self) -> Optional[cProfile.Profile]:
+        if not self.enabled:
+            return None
+        if not self.active.acquire(blocking=False):
+            with self.lock:
+                self.skipped += 1
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiling tool (a debugger, an outside cProfile run) got there first
+            self.active.release()
+            with self.lock:
+                self.skipped += 1
+            return None
+        return profile
+
+    def end(self, profile: cProfile.Profile) -> None:
+        profile.disable()
+        self.active.release()
+        with self.lock:
+            if self.stats is None:
+                self.stats = pstats.Stats(profile)
+            else:
+                self.stats.add(profile)
+            self.requests += 1
+
+    def get_status(self) -> Dict:
+        return {"enabled": self.enabled, "started": self.started, "requests": self.requests,
+                "skipped": self.skipped}
+
+    def report(self, sort: str = "cumulative", limit: int = 40) -> str:
+        with self.lock:
+            if self.stats is None:
+                return "No profiled requests\n"
+            output = io.StringIO()
+            self.stats.stream = output
+            self.stats.sort_stats(sort).print_stats(limit)
+            return output.getvalue()